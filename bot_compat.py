@@ -0,0 +1,551 @@
+# 兼容模式实现 - 仅在高级架构不可用时由bot.py导入
+
+import sys
+import os
+import io
+import html
+import re
+import signal
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from string import Template
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from src.utils.lazy_import import lazy_import
+
+# 重量级依赖延迟到首次使用时才导入
+tweepy = lazy_import('tweepy')
+Image = lazy_import('PIL.Image')
+telegram = lazy_import('telegram')
+telegram_ext = lazy_import('telegram.ext')
+telegram_request = lazy_import('telegram.request')
+
+# Twitter加权字数：URL固定按23计，CJK字符按2计
+_URL_RE = re.compile(r'https?://\S+')
+_CJK_RE = re.compile(r'[\u1100-\u11FF\u2E80-\u9FFF\uA960-\uA97F\uAC00-\uD7FF]')
+_URL_PLACEHOLDER = 'x' * 23
+
+def tweet_weight(text: str) -> int:
+    """按Twitter计数规则估算推文长度"""
+    text = _URL_RE.sub(_URL_PLACEHOLDER, text)
+    return len(text) + len(_CJK_RE.findall(text))
+
+# 健康检查固定响应，无需引入aiohttp
+_HEALTH_RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nOK'
+
+# 固定回复文本：/dm 只在启用私信功能时注册，相关提示按配置在初始化时构建一次
+def _build_start_text(dm_enabled: bool) -> str:
+    text = (
+        "你好！发送任何消息给我，我会自动转发到你的Twitter账户。\n\n"
+        "使用 /help 查看帮助信息。"
+    )
+    if dm_enabled:
+        text += "\n使用 /dm 启用私信监听功能。"
+    return text
+
+def _build_help_text(dm_enabled: bool) -> str:
+    items = [
+        "直接发送文本消息 - 将会发布到Twitter",
+        "发送图片（可带文字描述） - 将会发布图片到Twitter",
+        "/start - 开始使用",
+        "/help - 显示帮助信息",
+    ]
+    if dm_enabled:
+        items.append("/dm - 启用/查看私信监听功能")
+    items.append("/status - 查看Bot运行状态")
+    usage = "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+    return f"""
+使用方法：
+{usage}
+
+注意：消息长度不能超过280字符，图片将自动压缩优化
+        """
+
+_STATUS_TEMPLATE = """
+📊 <b>Bot 运行状态</b> (兼容模式)
+
+🤖 <b>Telegram Bot:</b> ✅ 在线
+🐦 <b>Twitter API:</b> {twitter_status}
+📩 <b>DM功能:</b> {dm_status}
+👤 <b>授权用户:</b> {first_name}
+
+💡 <b>使用提示:</b>
+• 直接发送文本 → 发布推文
+• 发送图片 → 发布图片推文
+• /help → 查看帮助
+""".strip()
+
+_STARTUP_TEMPLATE = Template("""
+🤖 <b>Twitter Bot 已启动</b> (兼容模式)
+
+✅ <b>状态:</b> 在线运行
+🔗 <b>Twitter API:</b> $twitter_status
+📩 <b>DM功能:</b> $dm_status
+⏰ <b>启动时间:</b> $started_at
+
+📝 发送任何消息给我，我会自动转发到你的Twitter账户
+$dm_hint发送 /help 查看帮助
+""".strip())
+
+def require_auth(func):
+    """处理程序装饰器 - 拒绝未授权用户"""
+    @functools.wraps(func)
+    async def wrapper(self, update, context):
+        if not self.is_authorized_user(update.effective_user.id):
+            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            return
+        return await func(self, update, context)
+    return wrapper
+
+def require_twitter(func):
+    """处理程序装饰器 - Twitter客户端不可用时直接提示"""
+    @functools.wraps(func)
+    async def wrapper(self, update, context):
+        if not self.twitter_client:
+            await update.message.reply_text("❌ Twitter API未正确配置，请检查环境变量。")
+            return
+        return await func(self, update, context)
+    return wrapper
+
+@dataclass(slots=True, frozen=True)
+class DMConfig:
+    """兼容模式的私信配置"""
+    enable_dm_monitoring: bool
+    dm_poll_interval: int
+    dm_target_chat_id: str
+    dm_store_file: str
+    dm_store_path: Path
+    dm_store_max_age_days: int
+
+class TwitterBot:
+    """兼容模式的TwitterBot实现，包含DM功能"""
+    
+    def __init__(self):
+        import logging
+        from dotenv import load_dotenv
+        
+        load_dotenv()
+        
+        logging.basicConfig(
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            level=logging.INFO
+        )
+        self.logger = logging.getLogger(__name__)
+        
+        # 基本配置
+        self.telegram_token = os.getenv('TELEGRAM_BOT_TOKEN')
+        self.twitter_api_key = os.getenv('TWITTER_API_KEY')
+        self.twitter_api_secret = os.getenv('TWITTER_API_SECRET')
+        self.twitter_access_token = os.getenv('TWITTER_ACCESS_TOKEN')
+        self.twitter_access_token_secret = os.getenv('TWITTER_ACCESS_TOKEN_SECRET')
+        self.twitter_bearer_token = os.getenv('TWITTER_BEARER_TOKEN')
+        self.authorized_user_id = os.getenv('AUTHORIZED_USER_ID')
+        self.app_url = os.getenv('APP_URL')
+        self.webhook_secret = os.getenv('TWITTER_WEBHOOK_SECRET')
+        
+        # 私信功能管理器（支持隔离加载）
+        self.dm_manager = None
+        self._dm_warmup = None
+        
+        # Telegram连接复用：run()中创建的Application，以及启动前使用的独立Bot
+        self.application = None
+        self._bot = None
+        
+        # tweepy为同步调用，放入有界线程池执行以免阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='tweepy')
+        
+        # 停止信号，由SIGINT/SIGTERM触发
+        self._shutdown_event = asyncio.Event()
+        
+        required = (
+            ('TELEGRAM_BOT_TOKEN', self.telegram_token),
+            ('TWITTER_API_KEY', self.twitter_api_key),
+            ('TWITTER_API_SECRET', self.twitter_api_secret),
+            ('TWITTER_ACCESS_TOKEN', self.twitter_access_token),
+            ('TWITTER_ACCESS_TOKEN_SECRET', self.twitter_access_token_secret),
+            ('TWITTER_BEARER_TOKEN', self.twitter_bearer_token),
+            ('AUTHORIZED_USER_ID', self.authorized_user_id),
+        )
+        missing = [name for name, value in required if not value]
+        if missing:
+            raise ValueError(f"Missing required environment variables: {', '.join(missing)}")
+        
+        # 授权用户ID解析一次为int，原字符串仅用于日志和chat_id
+        self.authorized_user_id_int = int(self.authorized_user_id)
+        
+        # 初始化Twitter客户端，优雅处理失败
+        try:
+            self.twitter_client = tweepy.Client(
+                bearer_token=self.twitter_bearer_token,
+                consumer_key=self.twitter_api_key,
+                consumer_secret=self.twitter_api_secret,
+                access_token=self.twitter_access_token,
+                access_token_secret=self.twitter_access_token_secret,
+                wait_on_rate_limit=True
+            )
+            self.logger.info("✅ Twitter客户端初始化成功")
+        except Exception as e:
+            self.logger.error(f"❌ Twitter客户端初始化失败: {e}")
+            self.twitter_client = None
+        
+        # 初始化Twitter API v1.1客户端用于媒体上传（复用同一会话）
+        try:
+            auth = tweepy.OAuth1UserHandler(
+                self.twitter_api_key,
+                self.twitter_api_secret,
+                self.twitter_access_token,
+                self.twitter_access_token_secret
+            )
+            self.twitter_api_v1 = tweepy.API(auth, retry_count=2, retry_delay=1)
+        except Exception as e:
+            self.logger.error(f"❌ Twitter媒体上传客户端初始化失败: {e}")
+            self.twitter_api_v1 = None
+            
+        # 初始化DM配置对象
+        self.dm_config = self._create_dm_config()
+        self._start_text = _build_start_text(self.dm_config.enable_dm_monitoring)
+        self._help_text = _build_help_text(self.dm_config.enable_dm_monitoring)
+    
+    def _create_dm_config(self):
+        """创建DM配置对象"""
+        dm_store_file = os.getenv('DM_STORE_FILE', 'data/processed_dm_ids.json')
+        # 数据目录只在创建配置时建立一次
+        dm_store_path = Path(dm_store_file)
+        dm_store_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        return DMConfig(
+            enable_dm_monitoring=os.getenv('ENABLE_DM_MONITORING', 'false').lower() == 'true',
+            # 轮询间隔低于30秒只会浪费API配额，因此设置下限
+            dm_poll_interval=max(30, int(os.getenv('DM_POLL_INTERVAL', '60'))),
+            dm_target_chat_id=os.getenv('DM_TARGET_CHAT_ID', self.authorized_user_id),
+            dm_store_file=dm_store_file,
+            dm_store_path=dm_store_path,
+            dm_store_max_age_days=int(os.getenv('DM_STORE_MAX_AGE_DAYS', '7'))
+        )
+    
+    def is_authorized_user(self, user_id: int) -> bool:
+        return user_id == self.authorized_user_id_int
+    
+    @require_auth
+    async def dm_command(self, update, context):
+        """处理/dm命令 - 启用或查看私信功能状态"""
+        try:
+            # 等待启动时的后台预热完成
+            if self._dm_warmup:
+                await self._dm_warmup
+                self._dm_warmup = None
+            
+            # 如果DM管理器未初始化，先初始化
+            if not self.dm_manager:
+                await self._initialize_dm_manager()
+            
+            # 尝试唤醒DM功能
+            result = await self.dm_manager.wake_up()
+            
+            status_emoji = {
+                'success': '✅',
+                'error': '❌', 
+                'info': 'ℹ️'
+            }.get(result['status'], '❓')
+            
+            response_text = f"{status_emoji} {html.escape(str(result['message']))}"
+            
+            # 如果成功启动，显示详细状态
+            if result['status'] == 'success':
+                dm_status = self.dm_manager.get_status()
+                response_text += f"\n\n📊 <b>私信监听状态</b>\n"
+                response_text += f"🔄 轮询间隔: {html.escape(str(dm_status.get('poll_interval', 'N/A')))}秒\n"
+                response_text += f"📱 目标聊天: {html.escape(str(self.dm_config.dm_target_chat_id))}\n"
+                response_text += f"💾 已处理: {dm_status.get('processed_count', 0)}条私信"
+            
+            await update.message.reply_text(response_text, parse_mode='HTML')
+            
+        except Exception as e:
+            self.logger.error(f"处理/dm命令时出错: {e}")
+            await update.message.reply_text(f"❌ 处理DM命令失败: {str(e)}")
+    
+    async def _initialize_dm_manager(self):
+        """初始化DM管理器 - 支持优雅失败"""
+        try:
+            from src.dm.manager import DMManager
+            
+            if not self.dm_manager:
+                self.dm_manager = DMManager(
+                    twitter_client=self.twitter_client,
+                    telegram_bot=self,
+                    config=self.dm_config
+                )
+                
+            # 如果未初始化，进行初始化（但不启动）
+            if not self.dm_manager.is_initialized:
+                await self.dm_manager.initialize()
+                self.logger.info("✅ DM管理器初始化完成")
+                
+        except ImportError:
+            self.logger.warning("⚠️ DM管理器模块不可用，跳过DM功能")
+            self.dm_manager = None
+        except Exception as e:
+            self.logger.error(f"❌ 初始化DM管理器失败: {e}")
+            self.dm_manager = None
+    
+    async def _run_blocking(self, func, *args, **kwargs):
+        """在线程池中执行阻塞调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def _get_bot(self):
+        """获取可复用的Bot实例（优先使用run()中的Application）"""
+        if self.application:
+            return self.application.bot
+        
+        if self._bot is None:
+            request = telegram_request.HTTPXRequest(connection_pool_size=32)
+            self._bot = telegram.Bot(token=self.telegram_token, request=request)
+            await self._bot.initialize()
+        return self._bot
+    
+    async def send_telegram_message(self, message: str):
+        """发送消息到Telegram"""
+        try:
+            bot = await self._get_bot()
+            await bot.send_message(
+                chat_id=self.authorized_user_id,
+                text=message,
+                parse_mode='HTML'
+            )
+        except Exception as e:
+            self.logger.error(f"发送Telegram消息失败: {e}")
+    
+    async def aclose(self):
+        """关闭独立Bot实例的连接池"""
+        bot, self._bot = self._bot, None
+        if bot is not None:
+            try:
+                await bot.shutdown()
+            except Exception as e:
+                self.logger.error(f"关闭Telegram Bot连接失败: {e}")
+    
+    async def run(self):
+        """运行兼容模式的机器人"""
+        from datetime import datetime
+        CommandHandler = telegram_ext.CommandHandler
+        MessageHandler = telegram_ext.MessageHandler
+        filters = telegram_ext.filters
+        
+        # 设置Telegram bot（发送与轮询使用独立的连接池）
+        application = (
+            telegram_ext.Application.builder()
+            .token(self.telegram_token)
+            .connection_pool_size(32)
+            .get_updates_connection_pool_size(4)
+            .build()
+        )
+        self.application = application
+        
+        # 添加基本处理程序（一次性批量注册）
+        handlers = [
+            CommandHandler("start", self._start_handler, block=False),
+            CommandHandler("help", self._help_handler, block=False),
+            CommandHandler("status", self._status_handler, block=False),
+            MessageHandler(filters.PHOTO, self._photo_handler, block=False),
+            MessageHandler(filters.TEXT & ~filters.COMMAND, self._text_handler, block=False),
+        ]
+        # 仅在启用私信功能时注册/dm命令
+        if self.dm_config.enable_dm_monitoring:
+            handlers.insert(3, CommandHandler("dm", self.dm_command, block=False))
+        application.add_handlers({0: handlers})
+        
+        # 设置健康检查服务器（任意路径均返回200 OK）
+        async def health_check(reader, writer):
+            try:
+                await reader.readuntil(b'\r\n\r\n')
+                writer.write(_HEALTH_RESPONSE)
+                await writer.drain()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+        
+        # 启动HTTP服务器
+        health_server = await asyncio.start_server(health_check, "0.0.0.0", 8000)
+        
+        self.logger.info("🌐 健康检查服务器启动在端口8000...")
+        self.logger.info("🤖 Bot开始运行...")
+        
+        # 启动Telegram bot
+        await application.initialize()
+        await application.start()
+        # 长轮询：Telegram最多挂起30秒再返回，并只订阅需要的更新类型
+        await application.updater.start_polling(
+            timeout=30,
+            poll_interval=0.0,
+            bootstrap_retries=-1,
+            allowed_updates=['message', 'callback_query']
+        )
+        
+        # 在后台预热私信功能，不阻塞启动（_initialize_dm_manager内部已优雅处理失败）
+        if self.dm_config.enable_dm_monitoring:
+            self._dm_warmup = asyncio.create_task(self._initialize_dm_manager())
+        
+        # 发送启动通知
+        try:
+            startup_message = _STARTUP_TEMPLATE.substitute(
+                twitter_status='已连接' if self.twitter_client else '未连接',
+                dm_status='可用' if self.dm_manager else ('初始化中' if self._dm_warmup else '不可用'),
+                dm_hint='使用 /dm 启用私信监听功能\n' if self.dm_config.enable_dm_monitoring else '',
+                started_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            )
+            
+            await self.send_telegram_message(startup_message)
+            self.logger.info("📢 启动通知已发送")
+        except Exception as e:
+            self.logger.error(f"发送启动通知失败: {e}")
+        
+        # 保持运行，直到收到停止信号
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._shutdown_event.set)
+            except NotImplementedError:
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(self._shutdown_event.set))
+        
+        try:
+            await self._shutdown_event.wait()
+            self.logger.info("👋 收到停止信号...")
+        finally:
+            # 优雅停止
+            if self._dm_warmup and not self._dm_warmup.done():
+                self._dm_warmup.cancel()
+            
+            if self.dm_manager:
+                try:
+                    await self.dm_manager.stop()
+                    self.logger.info("📩 私信功能已停止")
+                except Exception as e:
+                    self.logger.error(f"停止私信功能时出错: {e}")
+            
+            await application.updater.stop()
+            await application.stop()
+            await application.shutdown()
+            self.application = None
+            await self.aclose()
+            health_server.close()
+            await health_server.wait_closed()
+            self._executor.shutdown(wait=False)
+    
+    @require_auth
+    async def _start_handler(self, update, context):
+        await update.message.reply_text(self._start_text)
+    
+    @require_auth
+    async def _help_handler(self, update, context):
+        await update.message.reply_text(self._help_text)
+    
+    @require_auth
+    async def _status_handler(self, update, context):
+        status_message = _STATUS_TEMPLATE.format_map({
+            'twitter_status': "✅ 正常" if self.twitter_client else "❌ 失败",
+            'dm_status': "✅ 可用" if self.dm_manager else "❌ 不可用",
+            'first_name': update.effective_user.first_name,
+        })
+        
+        await update.message.reply_text(status_message, parse_mode='HTML')
+    
+    @require_auth
+    @require_twitter
+    async def _text_handler(self, update, context):
+        try:
+            message_text = update.message.text
+            
+            if tweet_weight(message_text) > 280:
+                await update.message.reply_text("📏 消息太长了！Twitter限制280字符以内。")
+                return
+            
+            response = await self._run_blocking(self.twitter_client.create_tweet, text=message_text)
+            tweet_id = response.data['id']
+            
+            await update.message.reply_text(
+                f"✅ 推文发送成功！\n\n"
+                f"🆔 推文ID: {tweet_id}\n"
+                f"📝 内容: {message_text}"
+            )
+            
+        except Exception as e:
+            self.logger.error(f"发送推文时出错: {e}")
+            error_msg = str(e)
+            if "401" in error_msg or "Unauthorized" in error_msg:
+                await update.message.reply_text("❌ Twitter API认证失败，请检查API密钥和权限设置。")
+            else:
+                await update.message.reply_text(f"❌ 发送推文失败: {error_msg}")
+    
+    @require_auth
+    @require_twitter
+    async def _photo_handler(self, update, context):
+        if not self.twitter_api_v1:
+            await update.message.reply_text("❌ Twitter API未正确配置，请检查环境变量。")
+            return
+            
+        try:
+            # 获取图片和文字描述
+            photo = update.message.photo[-1]  # 获取最大尺寸的图片
+            caption = update.message.caption or ""
+            
+            if tweet_weight(caption) > 280:
+                await update.message.reply_text("📏 文字描述太长了！Twitter限制280字符以内。")
+                return
+            
+            # 下载图片到内存
+            file = await context.bot.get_file(photo.file_id)
+            data = await file.download_as_bytearray()
+            
+            # 使用Pillow优化图片（全程在内存中完成）
+            output = io.BytesIO()
+            max_size = (2048, 2048)
+            with Image.open(io.BytesIO(data)) as img:
+                # JPEG按DCT比例直接解码为较小尺寸的RGB，LANCZOS只需处理更少像素（其他格式无影响）
+                img.draft('RGB', max_size)
+                
+                # 转换为RGB（Twitter需要），draft已输出RGB时跳过
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                
+                # 调整图片大小（Twitter限制5MB）
+                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+                
+                img.save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+            output.seek(0)
+            
+            # 上传媒体
+            media = await self._run_blocking(
+                self.twitter_api_v1.media_upload, filename='photo.jpg', file=output
+            )
+            
+            # 创建带媒体的推文
+            response = await self._run_blocking(
+                self.twitter_client.create_tweet,
+                text=caption,
+                media_ids=[media.media_id]
+            )
+            
+            tweet_id = response.data['id']
+            
+            await update.message.reply_text(
+                f"✅ 图片推文发送成功！\n\n"
+                f"🆔 推文ID: {tweet_id}\n"
+                f"📝 描述: {caption if caption else '无描述'}"
+            )
+            
+        except Exception as e:
+            self.logger.error(f"发送图片推文时出错: {e}")
+            error_msg = str(e)
+            if "401" in error_msg or "Unauthorized" in error_msg:
+                await update.message.reply_text("❌ Twitter API认证失败，请检查API密钥和权限设置。")
+            elif "413" in error_msg or "too large" in error_msg.lower():
+                await update.message.reply_text("❌ 图片太大，请发送较小的图片。")
+            else:
+                await update.message.reply_text(f"❌ 发送图片推文失败: {error_msg}")
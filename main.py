@@ -12,13 +12,6 @@ from src.utils.logger import setup_logging
 from src.utils.health_server import HealthServer
 from src.utils.exceptions import ConfigurationError, TwitterAPIError
 from src.utils.error_handler import ErrorHandler
-from src.dm.monitor import DMMonitor
-from src.dm.processor import DMProcessor
-from src.dm.notifier import TelegramNotifier
-from src.dm.store import DMStore
-from src.confirmation.confirmation_manager import ConfirmationManager
-from src.confirmation.preview_generator import PreviewGenerator
-from src.confirmation.button_handler import ButtonHandler
 
 class TwitterBot:
     def __init__(self):
@@ -30,6 +23,7 @@ class TwitterBot:
         self.health_server = None
         self.logger = None
         self._running = False
+        self._shutdown_event = asyncio.Event()
         
         # DM监听相关组件
         self.dm_store = None
@@ -37,6 +31,7 @@ class TwitterBot:
         self.dm_processor = None
         self.dm_monitor = None
         self.dm_monitor_task = None
+        self.dm_webhook = None
         
         # 确认功能相关组件
         self.confirmation_manager = None
@@ -76,13 +71,18 @@ class TwitterBot:
             
             # 初始化确认功能组件
             if self.config.enable_confirmation:
+                from src.confirmation.confirmation_manager import ConfirmationManager
+                from src.confirmation.preview_generator import PreviewGenerator
+                from src.confirmation.button_handler import ButtonHandler
+                
                 self.confirmation_manager = ConfirmationManager(self.config)
                 self.preview_generator = PreviewGenerator(self.config)
                 self.button_handler = ButtonHandler(
                     self.twitter_client,
                     self.confirmation_manager,
                     self.preview_generator,
-                    self.config
+                    self.config,
+                    media_loader=self.handlers.load_media
                 )
                 # 将确认功能组件传递给handlers
                 self.handlers.set_confirmation_components(
@@ -96,6 +96,11 @@ class TwitterBot:
             
             # 初始化DM监听组件
             if self.config.enable_dm_monitoring:
+                from src.dm.monitor import DMMonitor
+                from src.dm.processor import DMProcessor
+                from src.dm.notifier import TelegramNotifier
+                from src.dm.store import DMStore
+                
                 self.dm_store = DMStore(self.config)
                 self.dm_notifier = TelegramNotifier(self.telegram_bot, self.config)
                 self.dm_processor = DMProcessor(self.dm_notifier, self.config)
@@ -141,12 +146,29 @@ class TwitterBot:
             if bot_info:
                 self.logger.info(f"🤖 机器人信息: @{bot_info['username']}")
             
-            # 开始轮询
-            await self.telegram_bot.start_polling()
+            # 配置了webhook地址时由Telegram推送更新，否则长轮询
+            if self.config.telegram_webhook_url:
+                await self.telegram_bot.start_webhook(
+                    self.config.telegram_webhook_url,
+                    self.config.telegram_webhook_port,
+                    self.config.telegram_webhook_secret
+                )
+            else:
+                await self.telegram_bot.start_polling()
             self._running = True
             
-            # 启动DM监听（如果启用）
-            if self.dm_monitor:
+            # 启动DM监听（如果启用）：配置了webhook地址时接收推送，否则轮询
+            if self.dm_monitor and self.config.dm_webhook_url:
+                from src.dm.webhook import DMWebhookReceiver
+                self.dm_webhook = DMWebhookReceiver(
+                    self.dm_monitor,
+                    self.config.twitter_api_secret,
+                    port=self.config.dm_webhook_port,
+                    path=self.config.dm_webhook_path
+                )
+                await self.dm_webhook.start()
+                self.logger.info("📡 DM webhook接收器已启动")
+            elif self.dm_monitor:
                 self.dm_monitor_task = asyncio.create_task(self.dm_monitor.start_monitoring())
                 self.logger.info("🔍 DM监听器已启动")
             
@@ -160,8 +182,9 @@ class TwitterBot:
             if self.config.send_startup_notification:
                 await self._send_startup_notification()
             
-            # 保持运行
-            await asyncio.Event().wait()
+            # 保持运行，直到收到停止信号
+            await self._shutdown_event.wait()
+            self.logger.info("👋 收到停止信号...")
             
         except KeyboardInterrupt:
             self.logger.info("👋 收到停止信号...")
@@ -177,12 +200,16 @@ class TwitterBot:
             return
             
         self.logger.info("🛑 正在停止机器人...")
+        self._shutdown_event.set()
         
         try:
             # 停止DM监听
             if self.dm_monitor:
                 await self.dm_monitor.stop_monitoring()
             
+            if self.dm_webhook:
+                await self.dm_webhook.stop()
+            
             if self.dm_monitor_task and not self.dm_monitor_task.done():
                 self.dm_monitor_task.cancel()
                 try:
@@ -196,6 +223,14 @@ class TwitterBot:
             if self.health_server:
                 await self.health_server.stop()
             
+            # 关闭Twitter DM API连接池
+            if self.twitter_client:
+                self.twitter_client.close()
+            
+            # 关闭媒体下载会话
+            if self.handlers:
+                await self.handlers.media_processor.close()
+            
             # 清理确认管理器
             if self.confirmation_manager:
                 self.confirmation_manager.cleanup()
@@ -207,19 +242,21 @@ class TwitterBot:
             ErrorHandler.log_error(e, "停止机器人")
     
     def _setup_signal_handlers(self):
-        """设置信号处理器"""
-        def signal_handler(signum, frame):
-            self.logger.info(f"收到信号 {signum}")
-            asyncio.create_task(self.stop())
-        
-        signal.signal(signal.SIGINT, signal_handler)
-        signal.signal(signal.SIGTERM, signal_handler)
+        """设置信号处理器（在事件循环中唤醒关闭流程）"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self._shutdown_event.set)
+            except NotImplementedError:
+                # Windows不支持add_signal_handler，回退到线程安全的唤醒方式
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(self._shutdown_event.set))
     
     async def _send_startup_notification(self):
         """发送启动通知给授权用户"""
         try:
-            # 检查所有关键服务状态（不进行实际API调用以避免速率限制）
-            twitter_status = "⚠️ 待验证"
+            # 检查所有关键服务状态（仅读取已缓存的验证结果，不进行实际API调用以避免速率限制）
+            twitter_ok = self.twitter_client.connection_verified if self.twitter_client else None
+            twitter_status = {True: "✅ 已连接", False: "❌ 连接失败"}.get(twitter_ok, "⚠️ 待验证")
             dm_status = "✅ 启用" if self.dm_monitor else "❌ 禁用"
             
             notification_message = f"""🤖 专属小BOT启动成功！
@@ -243,6 +280,16 @@ class TwitterBot:
             self.logger.error(f"❌ 发送启动通知失败: {e}")
             # 不阻断启动流程，只记录错误
 
+def install_event_loop_policy():
+    """安装了uvloop时使用其事件循环（需在asyncio.run之前调用，Windows及未安装时使用默认循环）"""
+    if sys.platform == 'win32':
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
 async def main():
     """主函数"""
     bot = TwitterBot()
@@ -250,6 +297,7 @@ async def main():
 
 if __name__ == "__main__":
     try:
+        install_event_loop_policy()
         asyncio.run(main())
     except KeyboardInterrupt:
         print("\n👋 再见！")
@@ -4,10 +4,11 @@ logger = logging.getLogger(__name__)
 
 class AuthService:
     def __init__(self, authorized_user_id: str):
-        self.authorized_user_id = authorized_user_id
+        # 启动时解析一次为int，每条消息只做整数比较
+        self.authorized_user_id = int(authorized_user_id)
     
     def is_authorized(self, user_id: int) -> bool:
-        is_auth = str(user_id) == self.authorized_user_id
+        is_auth = user_id == self.authorized_user_id
         if not is_auth:
             logger.warning(f"Unauthorized access attempt from user ID: {user_id}")
         return is_auth
\ No newline at end of file
@@ -1,12 +1,34 @@
 import os
 import logging
-from dotenv import load_dotenv
+from functools import cached_property
+from pathlib import Path
+from types import MappingProxyType
 from typing import Dict, List
 from ..utils.exceptions import ConfigurationError
 
-load_dotenv()
+# 部署时可由tools/build_env_cache.py生成env_cache模块（已解析为int/bool/list的字面量），
+# 存在时跳过.env解析；真实环境变量仍然优先
+try:
+    from .env_cache import VALUES as _CACHED_VALUES
+except ImportError:
+    _CACHED_VALUES = {}
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        # 未安装python-dotenv时仅使用真实环境变量
+        pass
+
 logger = logging.getLogger(__name__)
 
+def _as_bool(value) -> bool:
+    """解析布尔配置（env_cache中已是bool）"""
+    return value if isinstance(value, bool) else value.lower() == 'true'
+
+def _as_list(value) -> List[str]:
+    """解析逗号分隔的列表配置（env_cache中已是list）"""
+    return value if isinstance(value, list) else value.split(',')
+
 class Config:
     """配置管理类"""
     
@@ -21,81 +43,137 @@ class Config:
     }
     
     def __init__(self):
-        self.telegram_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.twitter_api_key = os.getenv('TWITTER_API_KEY')
-        self.twitter_api_secret = os.getenv('TWITTER_API_SECRET')
-        self.twitter_access_token = os.getenv('TWITTER_ACCESS_TOKEN')
-        self.twitter_access_token_secret = os.getenv('TWITTER_ACCESS_TOKEN_SECRET')
-        self.twitter_bearer_token = os.getenv('TWITTER_BEARER_TOKEN')
-        self.authorized_user_id = os.getenv('AUTHORIZED_USER_ID')
+        # 一次性快照环境变量（叠加在env_cache之上），后续读取与校验都基于该快照
+        self._env = env = {**_CACHED_VALUES, **os.environ}
+        
+        self.telegram_token = env.get('TELEGRAM_BOT_TOKEN')
+        self.twitter_api_key = env.get('TWITTER_API_KEY')
+        self.twitter_api_secret = env.get('TWITTER_API_SECRET')
+        self.twitter_access_token = env.get('TWITTER_ACCESS_TOKEN')
+        self.twitter_access_token_secret = env.get('TWITTER_ACCESS_TOKEN_SECRET')
+        self.twitter_bearer_token = env.get('TWITTER_BEARER_TOKEN')
+        self.authorized_user_id = env.get('AUTHORIZED_USER_ID')
         
         # OAuth 2.0 配置（用于DM API）
-        self.twitter_oauth2_client_id = os.getenv('TWITTER_OAUTH2_CLIENT_ID')
-        self.twitter_oauth2_client_secret = os.getenv('TWITTER_OAUTH2_CLIENT_SECRET')
-        self.twitter_user_access_token = os.getenv('TWITTER_USER_ACCESS_TOKEN')
-        self.twitter_user_refresh_token = os.getenv('TWITTER_USER_REFRESH_TOKEN')
-        self.twitter_redirect_uri = os.getenv('TWITTER_REDIRECT_URI', 'http://localhost:8080/callback')
+        self.twitter_oauth2_client_id = env.get('TWITTER_OAUTH2_CLIENT_ID')
+        self.twitter_oauth2_client_secret = env.get('TWITTER_OAUTH2_CLIENT_SECRET')
+        self.twitter_user_access_token = env.get('TWITTER_USER_ACCESS_TOKEN')
+        self.twitter_user_refresh_token = env.get('TWITTER_USER_REFRESH_TOKEN')
+        self.twitter_redirect_uri = env.get('TWITTER_REDIRECT_URI', 'http://localhost:8080/callback')
+        
+        # Telegram webhook配置（设置URL后使用webhook代替长轮询）
+        self.telegram_webhook_url = env.get('TELEGRAM_WEBHOOK_URL')
+        self.telegram_webhook_port = int(env.get('TELEGRAM_WEBHOOK_PORT', '8443'))
+        self.telegram_webhook_secret = env.get('TELEGRAM_WEBHOOK_SECRET')
         
         # 可选配置
-        self.log_level = os.getenv('LOG_LEVEL', 'INFO')
-        self.health_port = int(os.getenv('HEALTH_PORT', '8000'))
-        self.tweet_max_length = int(os.getenv('TWEET_MAX_LENGTH', '280'))
+        self.log_level = env.get('LOG_LEVEL', 'INFO')
+        self.health_port = int(env.get('HEALTH_PORT', '8000'))
+        self.tweet_max_length = int(env.get('TWEET_MAX_LENGTH', '280'))
         
         # 媒体处理配置
-        self.max_image_size = int(os.getenv('MAX_IMAGE_SIZE', '5242880'))  # 5MB
-        self.supported_image_formats = os.getenv('SUPPORTED_IMAGE_FORMATS', 'jpg,jpeg,png,gif').split(',')
-        self.temp_dir = os.getenv('TEMP_DIR', './temp')
-        self.media_upload_timeout = int(os.getenv('MEDIA_UPLOAD_TIMEOUT', '30'))
+        self.max_image_size = int(env.get('MAX_IMAGE_SIZE', '5242880'))  # 5MB
+        self.supported_image_formats = _as_list(env.get('SUPPORTED_IMAGE_FORMATS', 'jpg,jpeg,png,gif'))
+        self.temp_dir = env.get('TEMP_DIR', './temp')
+        self.media_upload_timeout = int(env.get('MEDIA_UPLOAD_TIMEOUT', '30'))
         
         # DM监听配置
-        self.enable_dm_monitoring = os.getenv('ENABLE_DM_MONITORING', 'true').lower() == 'true'
-        self.dm_poll_interval = int(os.getenv('DM_POLL_INTERVAL', '60'))
-        self.dm_target_chat_id = os.getenv('DM_TARGET_CHAT_ID')
-        self.dm_store_file = os.getenv('DM_STORE_FILE', 'data/processed_dm_ids.json')
-        self.dm_store_max_age_days = int(os.getenv('DM_STORE_MAX_AGE_DAYS', '7'))
+        self.enable_dm_monitoring = _as_bool(env.get('ENABLE_DM_MONITORING', 'true'))
+        self.dm_poll_interval = int(env.get('DM_POLL_INTERVAL', '60'))
+        self.dm_max_poll_interval = int(env.get('DM_MAX_POLL_INTERVAL', '600'))  # 空闲时轮询间隔上限（秒）
+        self.dm_idle_backoff_factor = float(env.get('DM_IDLE_BACKOFF_FACTOR', '1.5'))  # 无新私信时间隔增长倍数
+        self.dm_concurrency = int(env.get('DM_CONCURRENCY', '5'))  # 同时处理的私信数量
+        self.dm_digest_threshold = int(env.get('DM_DIGEST_THRESHOLD', '3'))  # 纯文本私信合并发送的最小条数，0为不合并
+        self.dm_target_chat_id = env.get('DM_TARGET_CHAT_ID')
+        self.dm_store_file = env.get('DM_STORE_FILE', 'data/processed_dm_ids.json')
+        self.dm_store_path = Path(self.dm_store_file)
+        self.dm_store_max_age_days = int(env.get('DM_STORE_MAX_AGE_DAYS', '7'))
+        self.dm_store_max_ids = int(env.get('DM_STORE_MAX_IDS', '10000'))  # 内存中保留的已处理私信ID上限
+        self.dm_webhook_url = env.get('DM_WEBHOOK_URL')  # 设置后通过Account Activity webhook接收私信，不再轮询
+        self.dm_webhook_port = int(env.get('DM_WEBHOOK_PORT', '8081'))
+        self.dm_webhook_path = env.get('DM_WEBHOOK_PATH', '/webhooks/twitter')
         
         # 启动通知配置
-        self.send_startup_notification = os.getenv('SEND_STARTUP_NOTIFICATION', 'true').lower() == 'true'
+        self.send_startup_notification = _as_bool(env.get('SEND_STARTUP_NOTIFICATION', 'true'))
         
         # 确认功能配置
-        self.enable_confirmation = os.getenv('ENABLE_CONFIRMATION', 'true').lower() == 'true'
-        self.confirmation_timeout = int(os.getenv('CONFIRMATION_TIMEOUT', '300'))  # 5分钟超时
-        self.require_confirmation_for_all = os.getenv('REQUIRE_CONFIRMATION_FOR_ALL', 'true').lower() == 'true'
-        self.confirmation_button_timeout = int(os.getenv('CONFIRMATION_BUTTON_TIMEOUT', '900'))  # 15分钟按钮超时
+        self.enable_confirmation = _as_bool(env.get('ENABLE_CONFIRMATION', 'true'))
+        self.confirmation_timeout = int(env.get('CONFIRMATION_TIMEOUT', '300'))  # 5分钟超时
+        self.require_confirmation_for_all = _as_bool(env.get('REQUIRE_CONFIRMATION_FOR_ALL', 'true'))
+        self.confirmation_button_timeout = int(env.get('CONFIRMATION_BUTTON_TIMEOUT', '900'))  # 15分钟按钮超时
+        self.persist_confirmations = _as_bool(env.get('PERSIST_CONFIRMATIONS', 'false'))  # 重启后保留待确认推文
+        self.confirmation_db_file = env.get('CONFIRMATION_DB_FILE', 'data/confirmations.db')
         
         # 速率限制配置
-        self.rate_limit_min_interval = float(os.getenv('RATE_LIMIT_MIN_INTERVAL', '1.0'))  # 最小请求间隔（秒）
-        self.rate_limit_max_retries = int(os.getenv('RATE_LIMIT_MAX_RETRIES', '3'))  # 最大重试次数
-        self.rate_limit_backoff_factor = float(os.getenv('RATE_LIMIT_BACKOFF_FACTOR', '2.0'))  # 退避因子
-        self.rate_limit_enable_cache = os.getenv('RATE_LIMIT_ENABLE_CACHE', 'true').lower() == 'true'  # 启用缓存
-        self.rate_limit_cache_ttl = int(os.getenv('RATE_LIMIT_CACHE_TTL', '300'))  # 缓存TTL（秒）
+        self.rate_limit_min_interval = float(env.get('RATE_LIMIT_MIN_INTERVAL', '1.0'))  # 最小请求间隔（秒）
+        self.rate_limit_max_retries = int(env.get('RATE_LIMIT_MAX_RETRIES', '3'))  # 最大重试次数
+        self.rate_limit_backoff_factor = float(env.get('RATE_LIMIT_BACKOFF_FACTOR', '2.0'))  # 退避因子
+        self.rate_limit_enable_cache = _as_bool(env.get('RATE_LIMIT_ENABLE_CACHE', 'true'))  # 启用缓存
+        self.rate_limit_cache_ttl = int(env.get('RATE_LIMIT_CACHE_TTL', '300'))  # 缓存TTL（秒）
         
         # 测试模式配置
-        self.dry_run_mode = os.getenv('DRY_RUN_MODE', 'false').lower() == 'true'  # 启用dry-run模式
+        self.dry_run_mode = _as_bool(env.get('DRY_RUN_MODE', 'false'))  # 启用dry-run模式
         
         # Twitter验证配置
-        self.skip_twitter_verification = os.getenv('SKIP_TWITTER_VERIFICATION', 'false').lower() == 'true'  # 跳过Twitter验证
+        self.skip_twitter_verification = _as_bool(env.get('SKIP_TWITTER_VERIFICATION', 'false'))  # 跳过Twitter验证
         
         self._validate_config()
+        
+        # 配置加载后不再变化，预先生成脱敏快照供to_dict使用
+        self._public_dict = MappingProxyType({
+            'telegram_token': '***' if self.telegram_token else None,
+            'twitter_api_key': '***' if self.twitter_api_key else None,
+            'authorized_user_id': self.authorized_user_id,
+            'telegram_webhook_url': self.telegram_webhook_url,
+            'telegram_webhook_port': self.telegram_webhook_port,
+            'log_level': self.log_level,
+            'health_port': self.health_port,
+            'tweet_max_length': self.tweet_max_length,
+            'max_image_size': self.max_image_size,
+            'supported_image_formats': self.supported_image_formats,
+            'temp_dir': self.temp_dir,
+            'media_upload_timeout': self.media_upload_timeout,
+            'enable_dm_monitoring': self.enable_dm_monitoring,
+            'dm_poll_interval': self.dm_poll_interval,
+            'dm_max_poll_interval': self.dm_max_poll_interval,
+            'dm_idle_backoff_factor': self.dm_idle_backoff_factor,
+            'dm_concurrency': self.dm_concurrency,
+            'dm_digest_threshold': self.dm_digest_threshold,
+            'dm_target_chat_id': '***' if self.dm_target_chat_id else None,
+            'dm_store_file': self.dm_store_file,
+            'dm_store_max_age_days': self.dm_store_max_age_days,
+            'dm_store_max_ids': self.dm_store_max_ids,
+            'dm_webhook_url': self.dm_webhook_url,
+            'dm_webhook_port': self.dm_webhook_port,
+            'send_startup_notification': self.send_startup_notification,
+            'enable_confirmation': self.enable_confirmation,
+            'confirmation_timeout': self.confirmation_timeout,
+            'require_confirmation_for_all': self.require_confirmation_for_all,
+            'confirmation_button_timeout': self.confirmation_button_timeout,
+            'persist_confirmations': self.persist_confirmations,
+            'confirmation_db_file': self.confirmation_db_file
+        })
         logger.info("配置加载完成")
     
     def _validate_config(self):
         """验证配置参数"""
-        missing_vars = []
+        env = self._env
+        # 缺失变量只计算一次，get_missing_vars直接复用
+        self._missing_vars = [
+            var_name for var_name in self.REQUIRED_VARS
+            if not env.get(var_name, '').strip()
+        ]
         
-        for var_name, description in self.REQUIRED_VARS.items():
-            value = os.getenv(var_name)
-            if not value or not value.strip():
-                missing_vars.append(f"{var_name} ({description})")
-        
-        if missing_vars:
-            error_msg = f"缺少必需的环境变量:\n" + "\n".join(f"- {var}" for var in missing_vars)
+        if self._missing_vars:
+            error_msg = f"缺少必需的环境变量:\n" + "\n".join(
+                f"- {var} ({self.REQUIRED_VARS[var]})" for var in self._missing_vars
+            )
             logger.error(error_msg)
             raise ConfigurationError(error_msg)
         
-        # 验证授权用户ID格式
+        # 验证授权用户ID格式，并缓存解析结果
         try:
-            int(self.authorized_user_id)
+            self.authorized_user_id_int = int(self.authorized_user_id)
         except ValueError:
             raise ConfigurationError("AUTHORIZED_USER_ID必须是数字")
         
@@ -127,9 +205,38 @@ class Config:
         if self.dm_poll_interval <= 0:
             raise ConfigurationError("DM_POLL_INTERVAL必须大于0")
         
+        # 轮询间隔低于30秒只会浪费API配额并触发速率限制
+        if self.dm_poll_interval < 30:
+            logger.warning(f"DM_POLL_INTERVAL={self.dm_poll_interval}过小，已调整为30秒")
+            self.dm_poll_interval = 30
+        
+        if self.dm_max_poll_interval < self.dm_poll_interval:
+            raise ConfigurationError("DM_MAX_POLL_INTERVAL不能小于DM_POLL_INTERVAL")
+        
+        if self.dm_idle_backoff_factor < 1:
+            raise ConfigurationError("DM_IDLE_BACKOFF_FACTOR必须大于或等于1")
+        
+        if self.dm_concurrency <= 0:
+            raise ConfigurationError("DM_CONCURRENCY必须大于0")
+        
+        if self.dm_digest_threshold < 0:
+            raise ConfigurationError("DM_DIGEST_THRESHOLD必须大于或等于0")
+        
         if self.dm_store_max_age_days <= 0:
             raise ConfigurationError("DM_STORE_MAX_AGE_DAYS必须大于0")
         
+        if self.dm_store_max_ids <= 0:
+            raise ConfigurationError("DM_STORE_MAX_IDS必须大于0")
+        
+        if self.telegram_webhook_url:
+            if not self.telegram_webhook_url.startswith('https://'):
+                raise ConfigurationError("TELEGRAM_WEBHOOK_URL必须是HTTPS地址")
+            if not (1 <= self.telegram_webhook_port <= 65535):
+                raise ConfigurationError("TELEGRAM_WEBHOOK_PORT必须在1-65535范围内")
+        
+        if self.dm_webhook_url and not (1 <= self.dm_webhook_port <= 65535):
+            raise ConfigurationError("DM_WEBHOOK_PORT必须在1-65535范围内")
+        
         # 验证确认功能配置
         if self.confirmation_timeout <= 0:
             raise ConfigurationError("CONFIRMATION_TIMEOUT必须大于0")
@@ -150,9 +257,9 @@ class Config:
         if self.rate_limit_cache_ttl <= 0:
             raise ConfigurationError("RATE_LIMIT_CACHE_TTL必须大于0")
     
-    @property
+    @cached_property
     def twitter_credentials(self) -> Dict[str, str]:
-        """获取Twitter凭据"""
+        """获取Twitter凭据（配置加载后不再变化，首次访问时构建）"""
         return {
             'bearer_token': self.twitter_bearer_token,
             'consumer_key': self.twitter_api_key,
@@ -168,36 +275,11 @@ class Config:
     
     def get_missing_vars(self) -> List[str]:
         """获取缺失的环境变量列表"""
-        missing = []
-        for var_name in self.REQUIRED_VARS.keys():
-            if not os.getenv(var_name):
-                missing.append(var_name)
-        return missing
+        return list(self._missing_vars)
     
     def to_dict(self) -> Dict[str, any]:
         """将配置转换为字典（隐藏敏感信息）"""
-        return {
-            'telegram_token': '***' if self.telegram_token else None,
-            'twitter_api_key': '***' if self.twitter_api_key else None,
-            'authorized_user_id': self.authorized_user_id,
-            'log_level': self.log_level,
-            'health_port': self.health_port,
-            'tweet_max_length': self.tweet_max_length,
-            'max_image_size': self.max_image_size,
-            'supported_image_formats': self.supported_image_formats,
-            'temp_dir': self.temp_dir,
-            'media_upload_timeout': self.media_upload_timeout,
-            'enable_dm_monitoring': self.enable_dm_monitoring,
-            'dm_poll_interval': self.dm_poll_interval,
-            'dm_target_chat_id': '***' if self.dm_target_chat_id else None,
-            'dm_store_file': self.dm_store_file,
-            'dm_store_max_age_days': self.dm_store_max_age_days,
-            'send_startup_notification': self.send_startup_notification,
-            'enable_confirmation': self.enable_confirmation,
-            'confirmation_timeout': self.confirmation_timeout,
-            'require_confirmation_for_all': self.require_confirmation_for_all,
-            'confirmation_button_timeout': self.confirmation_button_timeout
-        }
+        return dict(self._public_dict)
 
 # 全局配置实例
 config = None
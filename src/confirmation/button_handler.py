@@ -1,58 +1,83 @@
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
 
-from .confirmation_manager import ConfirmationManager, ConfirmationStatus
+from .confirmation_manager import ConfirmationManager, ConfirmationStatus, ConfirmationKey
 from .preview_generator import PreviewGenerator
 from ..utils.error_handler import ErrorHandler
 
+# telegram仅在构建键盘时导入，只使用ConfirmationManager的模块无需加载
+if TYPE_CHECKING:
+    from telegram import Update, InlineKeyboardMarkup
+    from telegram.ext import ContextTypes
+
 logger = logging.getLogger(__name__)
 
 class ButtonHandler:
     """按钮回调处理器"""
     
     def __init__(self, twitter_client, confirmation_manager: ConfirmationManager, 
-                 preview_generator: PreviewGenerator, config):
+                 preview_generator: PreviewGenerator, config, media_loader=None):
         self.twitter_client = twitter_client
+        # media_loader(file_ids, bot) -> 图片数据列表；确认请求只保存file_id，发送时才下载图片
+        self.media_loader = media_loader
         self.confirmation_manager = confirmation_manager
         self.preview_generator = preview_generator
         self.config = config
+        
+        # 配置开关在初始化时解析一次
+        self._enable_confirmation = getattr(config, 'enable_confirmation', True)
+        self._require_all = getattr(config, 'require_confirmation_for_all', True)
+        
+        # 按钮动作分发表
+        self._handlers = {
+            'confirm': self._handle_confirm,
+            'edit': self._handle_edit,
+            'cancel': self._handle_cancel,
+            'retry': self._handle_retry,
+            'abandon': self._handle_abandon,
+        }
     
-    def create_confirmation_keyboard(self, confirmation_key: str) -> InlineKeyboardMarkup:
+    def create_confirmation_keyboard(self, confirmation_key: ConfirmationKey) -> 'InlineKeyboardMarkup':
         """创建确认按钮键盘"""
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        
+        callback_key = ConfirmationManager.format_key(confirmation_key)
         keyboard = [
             [
-                InlineKeyboardButton("✅ 确认发送", callback_data=f"confirm_{confirmation_key}"),
-                InlineKeyboardButton("✏️ 编辑内容", callback_data=f"edit_{confirmation_key}")
+                InlineKeyboardButton("✅ 确认发送", callback_data=f"confirm_{callback_key}"),
+                InlineKeyboardButton("✏️ 编辑内容", callback_data=f"edit_{callback_key}")
             ],
             [
-                InlineKeyboardButton("❌ 取消发送", callback_data=f"cancel_{confirmation_key}")
+                InlineKeyboardButton("❌ 取消发送", callback_data=f"cancel_{callback_key}")
             ]
         ]
         return InlineKeyboardMarkup(keyboard)
     
-    def create_retry_keyboard(self, confirmation_key: str) -> InlineKeyboardMarkup:
+    def create_retry_keyboard(self, confirmation_key: ConfirmationKey) -> 'InlineKeyboardMarkup':
         """创建重试按钮键盘"""
+        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+        
+        callback_key = ConfirmationManager.format_key(confirmation_key)
         keyboard = [
             [
-                InlineKeyboardButton("🔄 重试发送", callback_data=f"retry_{confirmation_key}"),
-                InlineKeyboardButton("❌ 放弃", callback_data=f"abandon_{confirmation_key}")
+                InlineKeyboardButton("🔄 重试发送", callback_data=f"retry_{callback_key}"),
+                InlineKeyboardButton("❌ 放弃", callback_data=f"abandon_{callback_key}")
             ]
         ]
         return InlineKeyboardMarkup(keyboard)
     
-    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def handle_callback(self, update: 'Update', context: 'ContextTypes.DEFAULT_TYPE'):
         """处理按钮回调"""
         query = update.callback_query
         await query.answer()
         
         try:
             callback_data = query.data
-            action, confirmation_key = callback_data.split('_', 1)
+            action, raw_key = callback_data.split('_', 1)
+            confirmation_key = ConfirmationManager.parse_key(raw_key)
             
             # 获取确认请求
-            pending_tweet = self.confirmation_manager.get_confirmation(confirmation_key)
+            pending_tweet = self.confirmation_manager.get_confirmation(confirmation_key) if confirmation_key else None
             if not pending_tweet:
                 await query.edit_message_text("❌ 确认请求不存在或已过期")
                 return
@@ -65,16 +90,9 @@ class ButtonHandler:
                 return
             
             # 处理不同的按钮动作
-            if action == "confirm":
-                await self._handle_confirm(query, confirmation_key, pending_tweet)
-            elif action == "edit":
-                await self._handle_edit(query, confirmation_key, pending_tweet)
-            elif action == "cancel":
-                await self._handle_cancel(query, confirmation_key, pending_tweet)
-            elif action == "retry":
-                await self._handle_retry(query, confirmation_key, pending_tweet)
-            elif action == "abandon":
-                await self._handle_abandon(query, confirmation_key, pending_tweet)
+            handler = self._handlers.get(action)
+            if handler:
+                await handler(query, confirmation_key, pending_tweet)
             else:
                 await query.edit_message_text("❌ 未知操作")
                 
@@ -82,7 +100,7 @@ class ButtonHandler:
             ErrorHandler.log_error(e, "按钮回调处理")
             await query.edit_message_text("❌ 处理请求时发生错误")
     
-    async def _handle_confirm(self, query, confirmation_key: str, pending_tweet):
+    async def _handle_confirm(self, query, confirmation_key: ConfirmationKey, pending_tweet):
         """处理确认发送"""
         try:
             # 更新状态为已确认
@@ -96,9 +114,11 @@ class ButtonHandler:
             
             # 发送推文
             if tweet.media_files:
-                result = await self.twitter_client.create_tweet_with_media(
-                    tweet.text, tweet.media_files
-                )
+                media = await self.media_loader(tweet.media_files, query.get_bot()) if self.media_loader else []
+                if media:
+                    result = await self.twitter_client.create_tweet_with_media(tweet.text, media)
+                else:
+                    result = {'success': False, 'error': '无法获取图片文件'}
             else:
                 result = await self.twitter_client.create_tweet(tweet.text)
             
@@ -134,7 +154,7 @@ class ButtonHandler:
                 reply_markup=retry_keyboard
             )
     
-    async def _handle_edit(self, query, confirmation_key: str, pending_tweet):
+    async def _handle_edit(self, query, confirmation_key: ConfirmationKey, pending_tweet):
         """处理编辑内容"""
         # 设置编辑模式
         self.confirmation_manager.set_editing_mode(confirmation_key)
@@ -148,7 +168,7 @@ class ButtonHandler:
         
         await query.edit_message_text(edit_msg, parse_mode='Markdown')
     
-    async def _handle_cancel(self, query, confirmation_key: str, pending_tweet):
+    async def _handle_cancel(self, query, confirmation_key: ConfirmationKey, pending_tweet):
         """处理取消发送"""
         self.confirmation_manager.cancel_tweet(confirmation_key)
         
@@ -161,25 +181,25 @@ class ButtonHandler:
         
         await query.edit_message_text(cancel_msg, parse_mode='Markdown')
     
-    async def _handle_retry(self, query, confirmation_key: str, pending_tweet):
+    async def _handle_retry(self, query, confirmation_key: ConfirmationKey, pending_tweet):
         """处理重试发送"""
         await self._handle_confirm(query, confirmation_key, pending_tweet)
     
-    async def _handle_abandon(self, query, confirmation_key: str, pending_tweet):
+    async def _handle_abandon(self, query, confirmation_key: ConfirmationKey, pending_tweet):
         """处理放弃发送"""
         await self._handle_cancel(query, confirmation_key, pending_tweet)
     
     def is_confirmation_enabled(self) -> bool:
         """检查确认功能是否启用"""
-        return getattr(self.config, 'enable_confirmation', True)
+        return self._enable_confirmation
     
     def should_require_confirmation(self, text: str, media_files: list = None) -> bool:
         """判断是否需要确认"""
-        if not self.is_confirmation_enabled():
+        if not self._enable_confirmation:
             return False
         
         # 检查是否所有推文都需要确认
-        if getattr(self.config, 'require_confirmation_for_all', True):
+        if self._require_all:
             return True
         
         # 其他条件可以在这里添加，比如：
@@ -1,12 +1,20 @@
 import asyncio
+import heapq
 import logging
 import time
-from typing import Dict, Optional, Any, List
+from collections import Counter
+from typing import Dict, Optional, Any, List, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+# 过期计算使用单调时钟，不受系统时间调整影响
+_now = time.monotonic
+
+# 确认请求键：(user_id, chat_id, message_id)
+ConfirmationKey = Tuple[int, int, int]
+
 class ConfirmationStatus(Enum):
     """确认状态枚举"""
     PENDING = "pending"       # 等待确认
@@ -15,7 +23,7 @@ class ConfirmationStatus(Enum):
     EXPIRED = "expired"       # 已超时
     EDITING = "editing"       # 编辑中
 
-@dataclass
+@dataclass(slots=True)
 class PendingTweet:
     """待发送推文数据"""
     user_id: int
@@ -23,13 +31,13 @@ class PendingTweet:
     message_id: int
     text: str
     media_files: List[str] = None
-    created_at: float = None
-    expires_at: float = None
+    created_at: float = None  # 单调时钟秒数
+    expires_at: float = None  # 单调时钟秒数
     status: ConfirmationStatus = ConfirmationStatus.PENDING
     
     def __post_init__(self):
         if self.created_at is None:
-            self.created_at = time.time()
+            self.created_at = _now()
         if self.media_files is None:
             self.media_files = []
 
@@ -38,48 +46,140 @@ class ConfirmationManager:
     
     def __init__(self, config):
         self.config = config
-        self._pending_tweets: Dict[str, PendingTweet] = {}
+        self._timeout = config.confirmation_timeout
+        self._pending_tweets: Dict[ConfirmationKey, PendingTweet] = {}
+        # 按状态计数，随状态变更增量维护，get_stats无需遍历
+        self._status_counts: Counter = Counter()
+        # 过期时间小顶堆 (expires_at, key)，已取消的条目作为墓碑在出堆时跳过
+        self._expiry_heap: List[Tuple[float, ConfirmationKey]] = []
+        self._wake = asyncio.Event()
+        
+        # 可选的SQLite持久化，内存字典作为直写缓存
+        self._store = None
+        if getattr(config, 'persist_confirmations', False):
+            from .store import ConfirmationStore
+            self._store = ConfirmationStore(getattr(config, 'confirmation_db_file', 'data/confirmations.db'))
+            self._restore()
+        
         self._cleanup_task = None
         self._start_cleanup_task()
     
+    def _restore(self):
+        """从持久化存储恢复未过期的确认请求"""
+        # 存储中为系统时间，换算为当前进程的单调时钟
+        offset = _now() - time.time()
+        for user_id, chat_id, message_id, text, media_files, created_at, expires_at, status in self._store.load_active():
+            tweet = PendingTweet(
+                user_id=user_id,
+                chat_id=chat_id,
+                message_id=message_id,
+                text=text,
+                media_files=media_files,
+                created_at=created_at + offset,
+                expires_at=expires_at + offset,
+                status=ConfirmationStatus(status)
+            )
+            key = (user_id, chat_id, message_id)
+            self._pending_tweets[key] = tweet
+            self._status_counts[tweet.status] += 1
+            self._expiry_heap.append((tweet.expires_at, key))
+        heapq.heapify(self._expiry_heap)
+        if self._pending_tweets:
+            logger.info(f"恢复了 {len(self._pending_tweets)} 个确认请求")
+    
     def _start_cleanup_task(self):
         """启动清理任务"""
         if self._cleanup_task is None:
             self._cleanup_task = asyncio.create_task(self._cleanup_expired_tweets())
     
     async def _cleanup_expired_tweets(self):
-        """定期清理过期的确认请求"""
+        """按最近的过期时间休眠，到期后清理过期的确认请求"""
+        heap = self._expiry_heap
         while True:
             try:
-                current_time = time.time()
-                expired_keys = []
+                current_time = _now()
                 
-                for key, tweet in self._pending_tweets.items():
-                    if current_time > tweet.expires_at and tweet.status == ConfirmationStatus.PENDING:
-                        tweet.status = ConfirmationStatus.EXPIRED
-                        expired_keys.append(key)
-                        logger.info(f"确认请求已过期: {key}")
+                expired_keys = []
+                while heap and heap[0][0] <= current_time:
+                    expires_at, key = heapq.heappop(heap)
+                    tweet = self._pending_tweets.get(key)
+                    # 已移除、被同键覆盖或已不在等待状态的条目直接丢弃
+                    if (tweet is None or tweet.expires_at != expires_at
+                            or tweet.status != ConfirmationStatus.PENDING):
+                        continue
+                    self._status_counts[tweet.status] -= 1
+                    tweet.status = ConfirmationStatus.EXPIRED
+                    expired_keys.append(key)
+                    logger.info(f"确认请求已过期: {key}")
                 
-                # 移除过期的确认请求
-                for key in expired_keys:
-                    del self._pending_tweets[key]
+                if expired_keys:
+                    # 大量同时过期（如停机后恢复）时整体重建字典，避免逐个删除
+                    if len(expired_keys) > len(self._pending_tweets) // 4:
+                        expired_set = set(expired_keys)
+                        self._pending_tweets = {
+                            k: v for k, v in self._pending_tweets.items() if k not in expired_set
+                        }
+                    else:
+                        for key in expired_keys:
+                            del self._pending_tweets[key]
+                    
+                    # 持久化存储中的过期记录批量删除
+                    if self._store:
+                        self._store.delete_expired(time.time())
                 
-                await asyncio.sleep(60)  # 每分钟检查一次
+                # 休眠到下一个过期时间，或被新的确认请求唤醒
+                timeout = heap[0][0] - current_time if heap else None
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
                 
             except Exception as e:
                 logger.error(f"清理过期确认请求时出错: {e}")
                 await asyncio.sleep(60)
     
-    def _generate_key(self, user_id: int, chat_id: int, message_id: int) -> str:
+    def _set_status(self, tweet: PendingTweet, status: ConfirmationStatus):
+        """变更状态并同步计数"""
+        self._status_counts[tweet.status] -= 1
+        self._status_counts[status] += 1
+        tweet.status = status
+        if self._store:
+            self._store.update_status((tweet.user_id, tweet.chat_id, tweet.message_id), status.value)
+    
+    def _remove(self, key: ConfirmationKey) -> Optional[PendingTweet]:
+        """移除确认请求并同步计数"""
+        tweet = self._pending_tweets.pop(key, None)
+        if tweet:
+            self._status_counts[tweet.status] -= 1
+            if self._store:
+                self._store.delete(key)
+        return tweet
+    
+    def _generate_key(self, user_id: int, chat_id: int, message_id: int) -> ConfirmationKey:
         """生成唯一键"""
-        return f"{user_id}_{chat_id}_{message_id}"
+        return (user_id, chat_id, message_id)
+    
+    @staticmethod
+    def format_key(key: ConfirmationKey) -> str:
+        """将键编码为紧凑字符串（用于按钮callback_data）"""
+        return f"{key[0]}:{key[1]}:{key[2]}"
+    
+    @staticmethod
+    def parse_key(raw: str) -> Optional[ConfirmationKey]:
+        """解析format_key生成的字符串，格式不符时返回None"""
+        try:
+            user_id, chat_id, message_id = raw.split(':')
+            return (int(user_id), int(chat_id), int(message_id))
+        except ValueError:
+            return None
     
     def create_confirmation(self, user_id: int, chat_id: int, message_id: int, 
-                          text: str, media_files: List[str] = None) -> str:
+                          text: str, media_files: List[str] = None) -> ConfirmationKey:
         """创建确认请求"""
         key = self._generate_key(user_id, chat_id, message_id)
         
-        current_time = time.time()
+        current_time = _now()
         pending_tweet = PendingTweet(
             user_id=user_id,
             chat_id=chat_id,
@@ -87,70 +187,76 @@ class ConfirmationManager:
             text=text,
             media_files=media_files or [],
             created_at=current_time,
-            expires_at=current_time + self.config.confirmation_timeout
+            expires_at=current_time + self._timeout
         )
         
+        self._remove(key)
         self._pending_tweets[key] = pending_tweet
+        self._status_counts[pending_tweet.status] += 1
+        heapq.heappush(self._expiry_heap, (pending_tweet.expires_at, key))
+        self._wake.set()
+        if self._store:
+            wall_offset = time.time() - current_time
+            self._store.save(key, text, pending_tweet.media_files,
+                             pending_tweet.created_at + wall_offset,
+                             pending_tweet.expires_at + wall_offset,
+                             pending_tweet.status.value)
         logger.info(f"创建确认请求: {key}")
         return key
     
-    def get_confirmation(self, key: str) -> Optional[PendingTweet]:
+    def get_confirmation(self, key: ConfirmationKey) -> Optional[PendingTweet]:
         """获取确认请求"""
         return self._pending_tweets.get(key)
     
-    def update_status(self, key: str, status: ConfirmationStatus) -> bool:
+    def update_status(self, key: ConfirmationKey, status: ConfirmationStatus) -> bool:
         """更新确认状态"""
-        if key in self._pending_tweets:
-            self._pending_tweets[key].status = status
-            logger.info(f"更新确认状态: {key} -> {status.value}")
-            return True
-        return False
+        tweet = self._pending_tweets.get(key)
+        if tweet is None:
+            return False
+        self._set_status(tweet, status)
+        logger.info(f"更新确认状态: {key} -> {status.value}")
+        return True
     
-    def confirm_tweet(self, key: str) -> Optional[PendingTweet]:
+    def confirm_tweet(self, key: ConfirmationKey) -> Optional[PendingTweet]:
         """确认发送推文"""
         tweet = self._pending_tweets.get(key)
         if tweet and tweet.status == ConfirmationStatus.PENDING:
-            tweet.status = ConfirmationStatus.CONFIRMED
+            self._set_status(tweet, ConfirmationStatus.CONFIRMED)
             logger.info(f"确认发送推文: {key}")
             return tweet
         return None
     
-    def cancel_tweet(self, key: str) -> bool:
+    def cancel_tweet(self, key: ConfirmationKey) -> bool:
         """取消发送推文"""
-        if key in self._pending_tweets:
-            self._pending_tweets[key].status = ConfirmationStatus.CANCELLED
-            del self._pending_tweets[key]
-            logger.info(f"取消发送推文: {key}")
-            return True
-        return False
-    
-    def set_editing_mode(self, key: str) -> bool:
+        tweet = self._remove(key)
+        if tweet is None:
+            return False
+        tweet.status = ConfirmationStatus.CANCELLED
+        logger.info(f"取消发送推文: {key}")
+        return True
+    
+    def set_editing_mode(self, key: ConfirmationKey) -> bool:
         """设置编辑模式"""
-        if key in self._pending_tweets:
-            self._pending_tweets[key].status = ConfirmationStatus.EDITING
-            logger.info(f"设置编辑模式: {key}")
-            return True
-        return False
+        tweet = self._pending_tweets.get(key)
+        if tweet is None:
+            return False
+        self._set_status(tweet, ConfirmationStatus.EDITING)
+        logger.info(f"设置编辑模式: {key}")
+        return True
     
-    def is_expired(self, key: str) -> bool:
+    def is_expired(self, key: ConfirmationKey) -> bool:
         """检查是否已过期"""
         tweet = self._pending_tweets.get(key)
         if tweet:
-            return time.time() > tweet.expires_at
+            return _now() > tweet.expires_at
         return True
     
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
-        total = len(self._pending_tweets)
-        pending = sum(1 for t in self._pending_tweets.values() 
-                     if t.status == ConfirmationStatus.PENDING)
-        editing = sum(1 for t in self._pending_tweets.values() 
-                     if t.status == ConfirmationStatus.EDITING)
-        
         return {
-            'total_confirmations': total,
-            'pending_confirmations': pending,
-            'editing_confirmations': editing,
+            'total_confirmations': len(self._pending_tweets),
+            'pending_confirmations': self._status_counts[ConfirmationStatus.PENDING],
+            'editing_confirmations': self._status_counts[ConfirmationStatus.EDITING],
             'cleanup_task_running': self._cleanup_task is not None and not self._cleanup_task.done()
         }
     
@@ -160,4 +266,10 @@ class ConfirmationManager:
             self._cleanup_task.cancel()
             self._cleanup_task = None
         self._pending_tweets.clear()
+        self._status_counts.clear()
+        self._expiry_heap.clear()
+        # 持久化的确认请求保留到下次启动
+        if self._store:
+            self._store.close()
+            self._store = None
         logger.info("确认管理器已清理")
\ No newline at end of file
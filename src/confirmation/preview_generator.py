@@ -5,12 +5,23 @@ from .confirmation_manager import PendingTweet
 
 logger = logging.getLogger(__name__)
 
+# 预编译的实体匹配规则
+_URL_RE = re.compile(r'https?://\S+')
+_HASHTAG_RE = re.compile(r'#\w+')
+_MENTION_RE = re.compile(r'@\w+')
+# 合并为一个正则，一次扫描同时统计三类实体（分组序号：1链接 2话题标签 3提及用户）
+_ENTITY_RE = re.compile(f'({_URL_RE.pattern})|({_HASHTAG_RE.pattern})|({_MENTION_RE.pattern})')
+
+# Markdown特殊字符转义表，一次translate完成全部替换
+_MD_ESCAPE = str.maketrans({'*': '\\*', '_': '\\_', '`': '\\`'})
+
 class PreviewGenerator:
     """预览内容生成器"""
     
     def __init__(self, config):
         self.config = config
         self.max_length = getattr(config, 'tweet_max_length', 280)
+        self._warn_length = self.max_length * 0.9
     
     def generate_preview(self, pending_tweet: PendingTweet) -> str:
         """生成确认预览消息"""
@@ -22,7 +33,7 @@ class PreviewGenerator:
             preview_text = f"""📝 *推文发送确认*
 
 *内容预览:*
-{self._format_preview_text(pending_tweet.text)}
+{self._format_preview_text(pending_tweet.text, char_count=text_info['char_count'])}
 
 📊 *推文信息:*
 • 字符数: {text_info['char_count']}/{self.max_length}
@@ -44,35 +55,31 @@ class PreviewGenerator:
         # 计算字符数
         char_count = len(text)
         
-        # 计算链接数量
-        url_pattern = r'https?://\S+'
-        links = re.findall(url_pattern, text)
-        link_count = len(links)
-        
-        # 计算话题标签数量
-        hashtag_pattern = r'#\w+'
-        hashtags = re.findall(hashtag_pattern, text)
-        hashtag_count = len(hashtags)
-        
-        # 计算提及用户数量
-        mention_pattern = r'@\w+'
-        mentions = re.findall(mention_pattern, text)
-        mention_count = len(mentions)
+        # 一次扫描统计链接、话题标签和提及用户，只计数不构建列表
+        counts = [0, 0, 0, 0]
+        # 不含'#'、'@'、'://'的文本不可能匹配任何实体，跳过正则扫描
+        if '#' in text or '@' in text or '://' in text:
+            for match in _ENTITY_RE.finditer(text):
+                counts[match.lastindex] += 1
         
         return {
             'char_count': char_count,
-            'link_count': link_count,
-            'hashtag_count': hashtag_count,
-            'mention_count': mention_count,
-            'links': links,
-            'hashtags': hashtags,
-            'mentions': mentions
+            'link_count': counts[1],
+            'hashtag_count': counts[2],
+            'mention_count': counts[3]
         }
     
-    def _format_preview_text(self, text: str, max_lines: int = 10) -> str:
-        """格式化预览文本"""
+    def _format_preview_text(self, text: str, max_lines: int = 10, char_count: int = None) -> str:
+        """格式化预览文本（char_count为已知的文本长度，可省去重复计算）"""
+        if char_count is None:
+            char_count = len(text)
+        
+        # 常见的短文本无需截断，跳过split/join
+        if char_count <= 500 and text.count('\n') < max_lines:
+            return f"```\n{text.translate(_MD_ESCAPE)}\n```"
+        
         # 如果文本太长，进行截断
-        if len(text) > 500:
+        if char_count > 500:
             text = text[:500] + "..."
         
         # 如果行数太多，进行截断
@@ -81,10 +88,8 @@ class PreviewGenerator:
             lines = lines[:max_lines]
             lines.append("...")
         
-        # 转义Markdown特殊字符
-        formatted_text = '\n'.join(lines)
         # 转义可能导致Markdown解析问题的字符
-        formatted_text = formatted_text.replace('*', '\\*').replace('_', '\\_').replace('`', '\\`')
+        formatted_text = '\n'.join(lines).translate(_MD_ESCAPE)
         
         return f"```\n{formatted_text}\n```"
     
@@ -92,7 +97,7 @@ class PreviewGenerator:
         """获取状态指示器"""
         if char_count > self.max_length:
             return f"🚨 *警告:* 字符数超出限制 ({char_count - self.max_length} 字符)"
-        elif char_count > self.max_length * 0.9:
+        elif char_count > self._warn_length:
             return f"⚠️ *提醒:* 接近字符限制 (剩余 {self.max_length - char_count} 字符)"
         else:
             return f"✅ *状态:* 字符数正常 (剩余 {self.max_length - char_count} 字符)"
@@ -108,13 +113,13 @@ class PreviewGenerator:
     
     def generate_error_message(self, error: str, pending_tweet: PendingTweet = None) -> str:
         """生成错误消息"""
-        base_msg = f"""❌ *发送失败:* {error}
-💡 *建议:* 请检查网络连接或稍后重试"""
+        parts = [f"""❌ *发送失败:* {error}
+💡 *建议:* 请检查网络连接或稍后重试"""]
         
         if pending_tweet:
-            base_msg += f"\n\n*原始内容:*\n{self._format_preview_text(pending_tweet.text)}"
+            parts.append(f"\n\n*原始内容:*\n{self._format_preview_text(pending_tweet.text)}")
         
-        return base_msg
+        return ''.join(parts)
     
     def generate_success_message(self, tweet_id: str, tweet_url: str, text: str) -> str:
         """生成成功消息"""
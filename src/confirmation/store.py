@@ -0,0 +1,107 @@
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from ..utils.error_handler import ErrorHandler
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_tweets (
+    user_id INTEGER NOT NULL,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    media_files TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (user_id, chat_id, message_id)
+)
+"""
+
+class ConfirmationStore:
+    """确认请求持久化存储 - 基于SQLite（WAL模式），重启后恢复未过期的确认请求
+
+    时间字段以系统时间（秒）保存，内存中的单调时钟时间由ConfirmationManager负责换算。
+    """
+
+    def __init__(self, db_file: str):
+        self.db_path = Path(db_file)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(self.db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+    def load_active(self) -> List[Tuple]:
+        """清除已过期记录并返回其余确认请求"""
+        try:
+            now = time.time()
+            with self._conn:
+                self._conn.execute("DELETE FROM pending_tweets WHERE expires_at <= ?", (now,))
+                # 旧版本保存的是带bot token的文件URL，不再可用且不应继续留存
+                self._conn.execute("DELETE FROM pending_tweets WHERE media_files LIKE '%://%'")
+            rows = self._conn.execute(
+                "SELECT user_id, chat_id, message_id, text, media_files, created_at, expires_at, status "
+                "FROM pending_tweets"
+            ).fetchall()
+            return [row[:4] + (json.loads(row[4]),) + row[5:] for row in rows]
+        except Exception as e:
+            ErrorHandler.log_error(e, "加载确认请求")
+            return []
+
+    def save(self, key: Tuple[int, int, int], text: str, media_files: List[str],
+             created_at: float, expires_at: float, status: str):
+        """写入（或覆盖）一条确认请求"""
+        try:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pending_tweets VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*key, text, json.dumps(media_files), created_at, expires_at, status)
+                )
+        except Exception as e:
+            ErrorHandler.log_error(e, f"保存确认请求 {key}")
+
+    def update_status(self, key: Tuple[int, int, int], status: str):
+        """更新确认请求状态"""
+        try:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE pending_tweets SET status = ? "
+                    "WHERE user_id = ? AND chat_id = ? AND message_id = ?",
+                    (status, *key)
+                )
+        except Exception as e:
+            ErrorHandler.log_error(e, f"更新确认请求状态 {key}")
+
+    def delete(self, key: Tuple[int, int, int]):
+        """删除确认请求"""
+        try:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM pending_tweets WHERE user_id = ? AND chat_id = ? AND message_id = ?",
+                    key
+                )
+        except Exception as e:
+            ErrorHandler.log_error(e, f"删除确认请求 {key}")
+
+    def delete_expired(self, before: float):
+        """批量删除指定系统时间之前过期的确认请求"""
+        try:
+            with self._conn:
+                self._conn.execute("DELETE FROM pending_tweets WHERE expires_at <= ?", (before,))
+        except Exception as e:
+            ErrorHandler.log_error(e, "清理过期确认请求")
+
+    def close(self):
+        """关闭数据库连接"""
+        try:
+            self._conn.close()
+        except Exception as e:
+            ErrorHandler.log_error(e, "关闭确认请求存储")
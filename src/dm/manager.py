@@ -22,12 +22,16 @@ class DMManager:
         self.telegram_notifier = None
         self.dm_processor = None
         self.dm_monitor = None
+        self.dm_webhook = None
         
         # 运行状态
         self.is_initialized = False
         self.is_running = False
         self.initialization_error = None
         
+        # 后台任务集合，任务结束后自动移除，停止时统一取消
+        self._tasks = set()
+        
     async def initialize(self) -> bool:
         """初始化私信功能组件"""
         try:
@@ -87,9 +91,15 @@ class DMManager:
             return
         
         try:
-            # 尝试获取私信权限
-            await self.twitter_client.get_direct_messages(max_results=1)
+            # 尝试获取私信权限（限时，避免初始化卡住）
+            await asyncio.wait_for(self.twitter_client.get_direct_messages(max_results=1), timeout=30)
             logger.info("✅ Twitter DM API权限测试成功")
+        except asyncio.CancelledError:
+            # 初始化被取消时释放连接池后继续向上传递
+            close = getattr(self.twitter_client, 'close', None)
+            if close:
+                close()
+            raise
         except Exception as e:
             logger.warning(f"⚠️ Twitter DM API测试失败: {e}")
             # 不抛出异常，允许功能降级运行
@@ -109,11 +119,23 @@ class DMManager:
                 logger.error("Twitter客户端未设置，无法启动私信监听")
                 return False
             
-            # 启动监听
-            self.monitor_task = asyncio.create_task(self.dm_monitor.start_monitoring())
+            # 配置了公网webhook地址时由Twitter推送私信，否则回退到轮询
+            if getattr(self.config, 'dm_webhook_url', None):
+                from .webhook import DMWebhookReceiver
+                self.dm_webhook = DMWebhookReceiver(
+                    self.dm_monitor,
+                    self.config.twitter_api_secret,
+                    port=getattr(self.config, 'dm_webhook_port', 8081),
+                    path=getattr(self.config, 'dm_webhook_path', '/webhooks/twitter')
+                )
+                await self.dm_webhook.start()
+            else:
+                task = asyncio.create_task(self.dm_monitor.start_monitoring(), name="dm_monitor")
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
             self.is_running = True
             
-            logger.info("🚀 私信监听已启动")
+            logger.info(f"🚀 私信监听已启动（{'webhook推送' if self.dm_webhook else '轮询'}模式）")
             return True
             
         except Exception as e:
@@ -129,12 +151,14 @@ class DMManager:
             if self.dm_monitor:
                 await self.dm_monitor.stop_monitoring()
             
-            if hasattr(self, 'monitor_task'):
-                self.monitor_task.cancel()
-                try:
-                    await self.monitor_task
-                except asyncio.CancelledError:
-                    pass
+            if self.dm_webhook:
+                await self.dm_webhook.stop()
+                self.dm_webhook = None
+            
+            tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
             
             self.is_running = False
             logger.info("🛑 私信监听已停止")
@@ -208,10 +232,23 @@ class DMManager:
                     'status': 'success',
                     'message': '私信功能已成功启动'
                 }
+            elif self.dm_webhook:
+                # webhook模式下没有轮询循环可唤醒，直接执行一次检查
+                new_count = await self.dm_monitor.check_now()
+                if new_count is None:
+                    message = '私信功能已在运行中（webhook模式），私信API频率限制中，暂时无法检查'
+                else:
+                    message = f'私信功能已在运行中（webhook模式），已完成一次检查，发现 {new_count} 条新私信'
+                return {
+                    'status': 'info',
+                    'message': message
+                }
             else:
+                # 已在运行时立即触发一次检查，无需等待轮询间隔
+                self.dm_monitor.wake()
                 return {
                     'status': 'info',
-                    'message': '私信功能已在运行中'
+                    'message': '私信功能已在运行中，已触发立即检查'
                 }
                 
         except Exception as e:
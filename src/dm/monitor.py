@@ -3,7 +3,7 @@ import logging
 import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timezone
-from ..utils.exceptions import TwitterAPIError
+from ..utils.exceptions import TwitterAPIError, RateLimitError
 from ..utils.error_handler import ErrorHandler
 
 logger = logging.getLogger(__name__)
@@ -11,15 +11,45 @@ logger = logging.getLogger(__name__)
 class DMMonitor:
     """Twitter私信监听器"""
     
+    __slots__ = (
+        'twitter_client', 'dm_processor', 'dm_store', 'config',
+        'is_running', 'poll_interval', 'enable_monitoring',
+        'min_interval', 'max_interval', 'idle_backoff_factor',
+        '_current_interval', '_next_allowed', '_sem', '_last_check_iso', '_wake',
+        'digest_threshold',
+    )
+    
     def __init__(self, twitter_client, dm_processor, dm_store, config):
         self.twitter_client = twitter_client
         self.dm_processor = dm_processor
         self.dm_store = dm_store
         self.config = config
+        # 监听前将已处理ID载入内存，轮询中的去重只做集合查找
+        self.dm_store.preload()
         self.is_running = False
         self.poll_interval = getattr(config, 'dm_poll_interval', 60)
         self.enable_monitoring = getattr(config, 'enable_dm_monitoring', True)
         
+        # 自适应轮询：有新私信时回到最小间隔，空闲时按倍数拉长，直到上限
+        self.min_interval = self.poll_interval
+        self.max_interval = max(self.min_interval, getattr(config, 'dm_max_poll_interval', 600))
+        self.idle_backoff_factor = getattr(config, 'dm_idle_backoff_factor', 1.5)
+        self._current_interval = self.min_interval
+        # 频率限制窗口结束的单调时钟时间，在此之前不发起请求
+        self._next_allowed = 0.0
+        
+        # 并发处理新私信的上限
+        self._sem = asyncio.Semaphore(getattr(config, 'dm_concurrency', 5))
+        
+        # 一批纯文本私信达到该数量时合并为一条摘要消息发送（0表示不合并）
+        self.digest_threshold = getattr(config, 'dm_digest_threshold', 3)
+        
+        # 最近一次成功拉取私信的时间，只在检查时格式化一次
+        self._last_check_iso: Optional[str] = None
+        
+        # 外部触发（/DM命令、webhook等）时立即开始下一次轮询
+        self._wake = asyncio.Event()
+        
     async def start_monitoring(self):
         """开始监听私信"""
         if not self.enable_monitoring:
@@ -31,12 +61,29 @@ class DMMonitor:
             return
             
         self.is_running = True
-        logger.info(f"🔍 开始监听Twitter私信，轮询间隔: {self.poll_interval}秒")
+        logger.info(f"🔍 开始监听Twitter私信，轮询间隔: {self.min_interval}-{self.max_interval}秒")
         
         while self.is_running:
             try:
-                await self._check_new_messages()
-                await asyncio.sleep(self.poll_interval)
+                # 处于频率限制窗口内时直接等到窗口结束，不发起注定失败的请求
+                wait = self._next_allowed - time.monotonic()
+                if wait > 0:
+                    logger.info("⏳ 私信API频率限制中，%.0f秒后继续", wait)
+                    await asyncio.sleep(wait)
+                
+                new_count = await self._check_new_messages()
+                if new_count:
+                    self._current_interval = self.min_interval
+                else:
+                    self._current_interval = min(self.max_interval,
+                                                 self._current_interval * self.idle_backoff_factor)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self._current_interval)
+                    # 被外部唤醒说明可能有新私信，回到最小轮询间隔
+                    self._wake.clear()
+                    self._current_interval = self.min_interval
+                except asyncio.TimeoutError:
+                    pass
                 
             except asyncio.CancelledError:
                 logger.info("私信监听被取消")
@@ -46,59 +93,129 @@ class DMMonitor:
                 # 错误后等待更长时间再重试
                 await asyncio.sleep(min(self.poll_interval * 2, 300))
     
+    async def check_now(self) -> Optional[int]:
+        """立即执行一次检查并返回新私信数量（webhook模式下没有轮询循环时使用），处于频率限制窗口内时返回None"""
+        if self._next_allowed > time.monotonic():
+            return None
+        return await self._check_new_messages()
+    
+    def wake(self):
+        """立即唤醒监听循环执行一次检查（不会越过频率限制窗口）"""
+        self._wake.set()
+    
     async def stop_monitoring(self):
         """停止监听私信"""
         if self.is_running:
             self.is_running = False
+            self._wake.set()
             logger.info("🛑 私信监听器已停止")
+        # 写入尚未落盘的已处理标记，并将日志合并回快照
+        await self.dm_store.flush(compact=True)
     
-    async def _check_new_messages(self):
-        """检查新私信"""
+    async def _check_new_messages(self) -> int:
+        """检查新私信，返回发现的新私信数量"""
         try:
-            # 获取最新私信
-            messages = await self.twitter_client.get_direct_messages()
+            # 获取最新私信（只取比已处理最大ID更新的）
+            messages = await self.twitter_client.get_direct_messages(since_id=self.dm_store.last_seen_id)
+            self._last_check_iso = datetime.now(timezone.utc).isoformat()
             
             if not messages:
                 logger.debug("没有新的私信")
-                return
-            
-            # 处理新消息
-            new_messages = []
-            for message in messages:
-                message_id = message.get('id')
-                if message_id and not self.dm_store.is_processed(message_id):
-                    new_messages.append(message)
+                return 0
             
-            if new_messages:
-                logger.info(f"📥 发现 {len(new_messages)} 条新私信")
-                await self._process_new_messages(new_messages)
-            else:
-                logger.debug("没有新的私信需要处理")
+            return await self.process_pushed_messages(messages)
                 
+        except RateLimitError as e:
+            # 优先使用响应头中的窗口结束时间，否则按15分钟窗口等待
+            if e.reset_at:
+                delay = max(0.0, e.reset_at - time.time())
+            else:
+                delay = 900
+            self._next_allowed = time.monotonic() + delay
+            logger.warning(f"私信API频率限制，{delay:.0f}秒内暂停轮询: {e}")
         except TwitterAPIError as e:
             logger.error(f"获取私信时出错: {e}")
         except Exception as e:
             ErrorHandler.log_error(e, "检查新私信")
+        return 0
+    
+    async def process_pushed_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """过滤已处理的私信并处理其余部分，返回新私信数量（轮询与webhook推送共用）"""
+        # 一次取出已处理集合，整批过滤
+        seen = self.dm_store.processed_set()
+        new_messages = [m for m in messages if m.get('id') and m['id'] not in seen]
+        
+        if new_messages:
+            logger.info("📥 发现 %d 条新私信", len(new_messages))
+            await self._process_new_messages(new_messages)
+        else:
+            logger.debug("没有新的私信需要处理")
+        return len(new_messages)
     
     async def _process_new_messages(self, messages: List[Dict[str, Any]]):
-        """处理新私信"""
-        for message in messages:
+        """并发处理新私信（受信号量限制）；突发的纯文本私信合并为摘要发送
+        
+        摘要只送达了前一部分时，其余私信回到逐条处理，已送达的不会重复发送。
+        """
+        ordered = sorted(messages, key=lambda m: int(m['id']))
+        delivered = await self._process_digest(ordered) if self._should_digest(ordered) else 0
+        results = [True] * delivered
+        if delivered < len(ordered):
+            results += await asyncio.gather(*(self._process_one(message) for message in ordered[delivered:]))
+        
+        # 按ID从小到大推进since_id，遇到未送达的私信即停止，下次轮询会重新获取它
+        # （results 为各条私信是否已送达Telegram并标记为已处理）
+        last_seen = None
+        for message, ok in zip(ordered, results):
+            if not ok:
+                logger.warning("私信 %s 未送达，since_id 停留在 %s，下次检查时重试",
+                               message['id'], last_seen or self.dm_store.last_seen_id)
+                break
+            last_seen = message['id']
+        if last_seen is not None:
+            self.dm_store.set_last_seen_id(last_seen)
+    
+    def _should_digest(self, messages: List[Dict[str, Any]]) -> bool:
+        """数量达到阈值且都不带媒体时才合并发送"""
+        if not self.digest_threshold or len(messages) < self.digest_threshold:
+            return False
+        return not any((m.get('attachments') or {}).get('media_keys') for m in messages)
+    
+    async def _process_digest(self, ordered: List[Dict[str, Any]]) -> int:
+        """将一批按ID排好序的私信合并为摘要发送，只标记已送达的部分，返回其数量"""
+        try:
+            delivered = await self.dm_processor.process_digest(ordered)
+        except Exception as e:
+            ErrorHandler.log_error(e, "合并发送私信摘要")
+            return 0
+        
+        for message in ordered[:delivered]:
+            await self.dm_store.mark_processed(message['id'])
+        if delivered:
+            logger.info("✅ %d 条私信已合并为摘要发送", delivered)
+        return delivered
+    
+    async def _process_one(self, message: Dict[str, Any]) -> bool:
+        """处理单条私信，成功后才标记为已处理，返回是否成功"""
+        message_id = message.get('id')
+        if not message_id:
+            return False
+        
+        async with self._sem:
             try:
-                message_id = message.get('id')
-                if not message_id:
-                    continue
-                
-                # 处理消息并发送到Telegram
-                await self.dm_processor.process_message(message)
+                # 处理消息并发送到Telegram，确认送达后才标记（至少一次）
+                if not await self.dm_processor.process_message(message):
+                    return False
                 
                 # 标记为已处理
-                self.dm_store.mark_processed(message_id)
+                await self.dm_store.mark_processed(message_id)
                 
-                logger.info(f"✅ 私信 {message_id} 处理完成")
+                logger.info("✅ 私信 %s 处理完成", message_id)
+                return True
                 
             except Exception as e:
-                ErrorHandler.log_error(e, f"处理私信 {message.get('id', 'unknown')}")
-                continue
+                ErrorHandler.log_error(e, f"处理私信 {message_id}")
+                return False
     
     def get_status(self) -> Dict[str, Any]:
         """获取监听器状态"""
@@ -106,6 +223,7 @@ class DMMonitor:
             'running': self.is_running,
             'enabled': self.enable_monitoring,
             'poll_interval': self.poll_interval,
+            'current_interval': self._current_interval,
             'processed_count': self.dm_store.get_processed_count(),
-            'last_check': datetime.now(timezone.utc).isoformat()
+            'last_check': self._last_check_iso or '尚未检查'
         }
\ No newline at end of file
@@ -1,9 +1,56 @@
+import asyncio
 import logging
-from typing import Dict, Any, Optional
+import random
+import re
+from typing import Dict, Any, List, Optional
 from ..utils.error_handler import ErrorHandler
+from ..utils.exceptions import TelegramAPIError
+from ..utils.rate_limiter import TokenBucket
+from ..utils.lazy_import import lazy_import
+
+telegram_helpers = lazy_import('telegram.helpers')
+telegram_error = lazy_import('telegram.error')
 
 logger = logging.getLogger(__name__)
 
+# 可以合并进sendMediaGroup的媒体类型，单组最多10个
+_GROUPABLE_TYPES = frozenset({'photo', 'image', 'video'})
+_MEDIA_GROUP_LIMIT = 10
+
+# Telegram全局限制约30条/秒，留出余量
+_TELEGRAM_SEND_RATE = 25
+
+# 摘要消息中各条私信的分隔线（MarkdownV2需转义'-'），单条Telegram消息最长4096字符
+_DIGEST_SEPARATOR = "\n\n\\-\\-\\-\n\n"
+_TELEGRAM_MAX_TEXT = 4096
+
+# 网络错误/超时的重试策略：最多3次，指数退避加随机抖动
+_SEND_MAX_ATTEMPTS = 3
+_SEND_BACKOFF_INITIAL = 1.0
+_SEND_BACKOFF_MAX = 10.0
+
+# MarkdownV2转义序列，纯文本回退时还原为原字符
+_MD_ESCAPE_RE = re.compile(r'\\([_*\[\]()~`>#+\-=|{}.!\\])')
+
+def _split_text(text: str, limit: int = _TELEGRAM_MAX_TEXT) -> List[str]:
+    """将超长的MarkdownV2文本按行拆分为不超过limit的多段
+    
+    模板中的格式标记都不跨行；单行超长（很长的私信正文）时在限制处切断，但不拆开转义序列。
+    """
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = limit
+            head = text[:cut]
+            if (len(head) - len(head.rstrip('\\'))) % 2:
+                cut -= 1
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text:
+        parts.append(text)
+    return parts
+
 class TelegramNotifier:
     """Telegram通知器 - 负责发送私信通知到Telegram"""
     
@@ -11,6 +58,8 @@ class TelegramNotifier:
         self.telegram_bot = telegram_bot
         self.config = config
         self.target_chat_id = getattr(config, 'dm_target_chat_id', None)
+        # 并发处理私信时，所有发送共享同一个令牌桶
+        self._send_bucket = TokenBucket(_TELEGRAM_SEND_RATE)
         
         # 验证配置
         if not self.target_chat_id:
@@ -38,48 +87,107 @@ class TelegramNotifier:
             ErrorHandler.log_error(e, f"发送私信通知 {message_data.get('id', 'unknown')}")
             return False
     
+    async def send_dm_digest(self, formatted_messages: List[str]) -> int:
+        """将多条已格式化的私信合并发送，超出单条消息长度时拆分为多条
+        
+        按顺序逐条发送，返回已送达的私信数量（从头开始计数）；某条消息发送失败时停止，
+        其后的私信由调用方另行处理，已送达的部分不会被重复发送。
+        """
+        if not self.target_chat_id:
+            logger.error("未设置目标聊天ID，无法发送私信通知")
+            return 0
+        
+        # 每条消息记录其包含的私信数量
+        chunks = []
+        current, count = "", 0
+        for text in formatted_messages:
+            candidate = f"{current}{_DIGEST_SEPARATOR}{text}" if current else text
+            if len(candidate) > _TELEGRAM_MAX_TEXT and current:
+                chunks.append((current, count))
+                candidate, count = text, 0
+            current, count = candidate, count + 1
+        if current:
+            chunks.append((current, count))
+        
+        delivered = 0
+        for chunk, count in chunks:
+            try:
+                await self._send_text_message(chunk)
+            except Exception as e:
+                ErrorHandler.log_error(e, "发送私信摘要")
+                break
+            delivered += count
+        
+        logger.info(f"私信摘要发送: {delivered}/{len(formatted_messages)}条私信已送达")
+        return delivered
+    
+    async def _send(self, method, **kwargs):
+        """统一的发送入口：限流后调用Bot方法，网络错误与429在此集中重试
+        
+        BadRequest（内容或URL无效）重试无意义，直接抛给调用方处理。
+        """
+        for attempt in range(1, _SEND_MAX_ATTEMPTS + 1):
+            await self._send_bucket.acquire()
+            try:
+                return await method(**kwargs)
+            except telegram_error.BadRequest:
+                raise
+            except telegram_error.RetryAfter as e:
+                if attempt == _SEND_MAX_ATTEMPTS:
+                    raise
+                delay = float(e.retry_after)
+                logger.warning(f"⏳ Telegram频率限制，{delay:.0f}秒后重试")
+            except telegram_error.NetworkError as e:
+                if attempt == _SEND_MAX_ATTEMPTS:
+                    raise
+                delay = min(_SEND_BACKOFF_MAX, _SEND_BACKOFF_INITIAL * 2 ** (attempt - 1))
+                delay += random.uniform(0, delay)
+                logger.warning(f"Telegram网络错误，{delay:.1f}秒后第{attempt + 1}次尝试: {e}")
+            await asyncio.sleep(delay)
+    
     async def _send_text_message(self, text: str):
-        """发送文本消息"""
+        """发送文本消息（MarkdownV2，调用方负责转义插入的动态内容），发送失败时抛出异常"""
         try:
             # 获取bot实例
             if not self.telegram_bot.application or not self.telegram_bot.application.bot:
-                logger.error("Telegram bot未初始化")
-                return
+                raise TelegramAPIError("Telegram bot未初始化")
             
             bot = self.telegram_bot.application.bot
             
-            # 发送消息
-            await bot.send_message(
-                chat_id=self.target_chat_id,
-                text=text,
-                parse_mode='Markdown',
-                disable_web_page_preview=True
-            )
+            # 超出单条消息长度时拆分发送
+            for part in _split_text(text):
+                try:
+                    await self._send(
+                        bot.send_message,
+                        chat_id=self.target_chat_id,
+                        text=part,
+                        parse_mode='MarkdownV2',
+                        disable_web_page_preview=True
+                    )
+                except telegram_error.BadRequest as e:
+                    # 实体解析失败等格式问题：去掉转义后以纯文本重发一次，仍失败则抛出
+                    logger.warning(f"MarkdownV2消息被拒绝（{e}），改为纯文本发送")
+                    await self._send(
+                        bot.send_message,
+                        chat_id=self.target_chat_id,
+                        text=_MD_ESCAPE_RE.sub(r'\1', part)[:_TELEGRAM_MAX_TEXT],
+                        disable_web_page_preview=True
+                    )
             
             logger.debug("文本私信通知发送成功")
             
         except Exception as e:
             logger.error(f"发送文本消息失败: {e}")
-            # 如果Markdown格式失败，尝试普通文本
-            try:
-                bot = self.telegram_bot.application.bot
-                await bot.send_message(
-                    chat_id=self.target_chat_id,
-                    text=text,
-                    disable_web_page_preview=True
-                )
-                logger.info("使用普通文本格式重新发送成功")
-            except Exception as e2:
-                logger.error(f"普通文本发送也失败: {e2}")
-                raise
+            raise
     
     async def _send_media_messages(self, media_list: list):
-        """发送媒体消息"""
+        """发送媒体消息 - 连续的图片/视频合并为媒体组一次发送"""
         try:
             if not media_list:
                 return
             
             bot = self.telegram_bot.application.bot
+            group = []
             
             for media in media_list:
                 media_type = media.get('type', '').lower()
@@ -89,61 +197,106 @@ class TelegramNotifier:
                     logger.warning(f"媒体没有可用的URL: {media}")
                     continue
                 
-                try:
-                    if media_type in ['photo', 'image']:
-                        await bot.send_photo(
-                            chat_id=self.target_chat_id,
-                            photo=media_url,
-                            caption=f"📎 来自Twitter私信的图片"
-                        )
-                    elif media_type in ['video']:
-                        await bot.send_video(
-                            chat_id=self.target_chat_id,
-                            video=media_url,
-                            caption=f"📎 来自Twitter私信的视频"
-                        )
-                    elif media_type in ['animated_gif', 'gif']:
-                        await bot.send_animation(
-                            chat_id=self.target_chat_id,
-                            animation=media_url,
-                            caption=f"📎 来自Twitter私信的GIF"
-                        )
-                    else:
-                        # 对于其他类型，发送链接
-                        await bot.send_message(
-                            chat_id=self.target_chat_id,
-                            text=f"📎 媒体文件 ({media_type}): {media_url}"
-                        )
-                    
-                    logger.debug(f"媒体发送成功: {media_type}")
-                    
-                except Exception as e:
-                    logger.warning(f"发送媒体失败: {e}")
-                    # 如果媒体发送失败，发送链接
-                    try:
-                        await bot.send_message(
-                            chat_id=self.target_chat_id,
-                            text=f"📎 媒体文件链接 ({media_type}): {media_url}"
-                        )
-                    except Exception as e2:
-                        logger.error(f"发送媒体链接也失败: {e2}")
+                if media_type in _GROUPABLE_TYPES:
+                    group.append((media_type, media_url))
+                    if len(group) == _MEDIA_GROUP_LIMIT:
+                        await self._send_media_group(bot, group)
+                        group = []
+                else:
+                    # 不支持合并的类型打断当前分组，保持原有顺序
+                    if group:
+                        await self._send_media_group(bot, group)
+                        group = []
+                    await self._send_single_media(bot, media_type, media_url)
+            
+            if group:
+                await self._send_media_group(bot, group)
             
         except Exception as e:
             logger.error(f"发送媒体消息失败: {e}")
     
+    async def _send_media_group(self, bot, group: list):
+        """通过sendMediaGroup发送一组图片/视频（Telegram要求2-10个），说明文字只放在第一项"""
+        if len(group) == 1:
+            await self._send_single_media(bot, *group[0])
+            return
+        
+        from telegram import InputMediaPhoto, InputMediaVideo
+        
+        caption = f"📎 来自Twitter私信的{len(group)}个媒体文件"
+        items = []
+        for index, (media_type, media_url) in enumerate(group):
+            media_cls = InputMediaVideo if media_type == 'video' else InputMediaPhoto
+            items.append(media_cls(media=media_url, caption=caption if index == 0 else None))
+        
+        try:
+            await self._send(bot.send_media_group, chat_id=self.target_chat_id, media=items)
+            logger.debug(f"媒体组发送成功: {len(items)}个")
+        except telegram_error.BadRequest as e:
+            logger.warning(f"发送媒体组失败，改为逐个发送: {e}")
+            for media_type, media_url in group:
+                await self._send_single_media(bot, media_type, media_url)
+    
+    async def _send_single_media(self, bot, media_type: str, media_url: str):
+        """发送单个媒体，Telegram无法处理该媒体时退回发送链接"""
+        try:
+            if media_type in ['photo', 'image']:
+                await self._send(
+                    bot.send_photo,
+                    chat_id=self.target_chat_id,
+                    photo=media_url,
+                    caption=f"📎 来自Twitter私信的图片"
+                )
+            elif media_type in ['video']:
+                await self._send(
+                    bot.send_video,
+                    chat_id=self.target_chat_id,
+                    video=media_url,
+                    caption=f"📎 来自Twitter私信的视频"
+                )
+            elif media_type in ['animated_gif', 'gif']:
+                await self._send(
+                    bot.send_animation,
+                    chat_id=self.target_chat_id,
+                    animation=media_url,
+                    caption=f"📎 来自Twitter私信的GIF"
+                )
+            else:
+                # 对于其他类型，发送链接
+                await self._send(
+                    bot.send_message,
+                    chat_id=self.target_chat_id,
+                    text=f"📎 媒体文件 ({media_type}): {media_url}"
+                )
+            
+            logger.debug(f"媒体发送成功: {media_type}")
+            
+        except telegram_error.BadRequest as e:
+            logger.warning(f"发送媒体失败: {e}")
+            # Telegram无法获取或识别该媒体时，发送链接
+            try:
+                await self._send(
+                    bot.send_message,
+                    chat_id=self.target_chat_id,
+                    text=f"📎 媒体文件链接 ({media_type}): {media_url}"
+                )
+            except Exception as e2:
+                logger.error(f"发送媒体链接也失败: {e2}")
+    
     async def send_dm_status(self, status_info: Dict[str, Any]):
         """发送私信监听状态信息"""
         try:
             if not self.target_chat_id:
                 return
             
-            status_text = f"""🔍 **私信监听状态**
+            escape = telegram_helpers.escape_markdown
+            status_text = f"""🔍 *私信监听状态*
 
-📊 **运行状态**: {'✅ 运行中' if status_info.get('running') else '❌ 已停止'}
-⚙️ **监听启用**: {'✅ 是' if status_info.get('enabled') else '❌ 否'}
-⏱️ **轮询间隔**: {status_info.get('poll_interval', 'unknown')}秒
-📈 **已处理**: {status_info.get('processed_count', 0)}条私信
-🕒 **最后检查**: {status_info.get('last_check', 'unknown')}"""
+📊 *运行状态*: {'✅ 运行中' if status_info.get('running') else '❌ 已停止'}
+⚙️ *监听启用*: {'✅ 是' if status_info.get('enabled') else '❌ 否'}
+⏱️ *轮询间隔*: {escape(str(status_info.get('poll_interval', 'unknown')), version=2)}秒
+📈 *已处理*: {escape(str(status_info.get('processed_count', 0)), version=2)}条私信
+🕒 *最后检查*: {escape(str(status_info.get('last_check', 'unknown')), version=2)}"""
             
             await self._send_text_message(status_text)
             
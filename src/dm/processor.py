@@ -1,10 +1,39 @@
 import logging
+from functools import lru_cache
 from typing import Dict, Any, Optional, List
 from datetime import datetime, timezone
 from ..utils.error_handler import ErrorHandler
+from ..utils.lazy_import import lazy_import
+
+# 首次格式化私信时才导入telegram
+telegram_helpers = lazy_import('telegram.helpers')
 
 logger = logging.getLogger(__name__)
 
+# 私信通知模板（MarkdownV2），模块加载时构建一次，每条私信只做字段插值；
+# 插入的字段必须先经过 _md 转义，模板本身的标记字符不参与转义
+_MSG_TEMPLATE = (
+    "📩 *Twitter私信通知*\n\n"
+    "👤 *发送者*: @{username} \\({name}\\)\n"
+    "🕒 *时间*: {time_str}\n"
+    "💬 *内容*: {text}\n\n"
+    "🔗 *消息ID*: {mid}"
+)
+
+def _md(value) -> str:
+    """转义MarkdownV2特殊字符，保证用户内容不会破坏消息格式"""
+    return telegram_helpers.escape_markdown(str(value), version=2)
+
+@lru_cache(maxsize=2048)
+def _iso_to_dt(s: str) -> datetime:
+    """解析ISO 8601时间字符串，轮询窗口中重复出现的旧私信直接命中缓存"""
+    return datetime.fromisoformat(s[:-1] + '+00:00' if s.endswith('Z') else s)
+
+@lru_cache(maxsize=1024)
+def _fmt_ts(epoch: int) -> str:
+    """按秒缓存时间格式化结果，同一秒内的一批私信只格式化一次"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+
 class DMProcessor:
     """私信处理器 - 负责格式化私信内容"""
     
@@ -13,31 +42,48 @@ class DMProcessor:
         self.config = config
         self.target_chat_id = getattr(config, 'dm_target_chat_id', None)
         
-    async def process_message(self, message: Dict[str, Any]):
-        """处理单条私信"""
+    async def process_message(self, message: Dict[str, Any]) -> bool:
+        """处理单条私信，返回是否处理完成；通知未送达Telegram时返回False，调用方不应标记为已处理"""
         try:
             # 解析消息内容
             message_data = self._parse_message(message)
             
             if not message_data:
-                logger.warning(f"无法解析私信: {message.get('id', 'unknown')}")
-                return
+                # 重试也无法解析，按已处理对待，避免阻塞since_id水位线
+                logger.warning("无法解析私信: %s", message.get('id', 'unknown'))
+                return True
             
             # 格式化消息
             formatted_message = self._format_message(message_data)
             
             # 发送到Telegram
-            await self.telegram_notifier.send_dm_notification(
+            delivered = await self.telegram_notifier.send_dm_notification(
                 formatted_message, 
                 message_data
             )
+            if not delivered:
+                logger.warning("私信通知未送达: %s", message_data['id'])
+                return False
             
-            logger.info(f"私信处理完成: {message_data['id']}")
+            logger.info("私信处理完成: %s", message_data['id'])
+            return True
             
         except Exception as e:
             ErrorHandler.log_error(e, f"处理私信 {message.get('id', 'unknown')}")
             raise
     
+    async def process_digest(self, messages: List[Dict[str, Any]]) -> int:
+        """将多条私信格式化后合并为摘要发送，返回按顺序已送达的私信数量"""
+        formatted_messages = []
+        for message in messages:
+            message_data = self._parse_message(message)
+            if not message_data:
+                logger.warning("无法解析私信: %s", message.get('id', 'unknown'))
+                return 0
+            formatted_messages.append(self._format_message(message_data))
+        
+        return await self.telegram_notifier.send_dm_digest(formatted_messages)
+    
     def _parse_message(self, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """解析私信数据"""
         try:
@@ -67,12 +113,11 @@ class DMProcessor:
                 'sender_id': sender_id,
                 'sender_info': sender_info,
                 'media': media_info,
-                'timestamp': timestamp,
-                'raw_message': message
+                'timestamp': timestamp
             }
             
         except Exception as e:
-            logger.error(f"解析私信数据时出错: {e}")
+            logger.error("解析私信数据时出错: %s", e)
             return None
     
     def _extract_user_info(self, message: Dict[str, Any], sender_id: str) -> Dict[str, Any]:
@@ -84,23 +129,23 @@ class DMProcessor:
         }
         
         try:
-            # 尝试从includes.users中获取用户信息
+            # 尝试从includes.users中获取用户信息（按ID建索引后直接查找）
             includes = message.get('includes', {})
-            users = includes.get('users', [])
+            users_by_id = {user.get('id'): user for user in includes.get('users', [])}
             
-            for user in users:
-                if user.get('id') == sender_id:
-                    return {
-                        'username': user.get('username', default_info['username']),
-                        'name': user.get('name', default_info['name']),
-                        'profile_image_url': user.get('profile_image_url')
-                    }
+            user = users_by_id.get(sender_id)
+            if user is None:
+                # 如果没有找到详细信息，返回默认信息
+                return default_info
             
-            # 如果没有找到详细信息，返回默认信息
-            return default_info
+            return {
+                'username': user.get('username', default_info['username']),
+                'name': user.get('name', default_info['name']),
+                'profile_image_url': user.get('profile_image_url')
+            }
             
         except Exception as e:
-            logger.warning(f"提取用户信息时出错: {e}")
+            logger.warning("提取用户信息时出错: %s", e)
             return default_info
     
     def _extract_media_info(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -115,24 +160,23 @@ class DMProcessor:
             if not media_keys:
                 return media_list
             
-            # 从includes.media中获取媒体详情
+            # 从includes.media中获取媒体详情（按media_key建索引，避免嵌套遍历）
             includes = message.get('includes', {})
-            media_objects = includes.get('media', [])
+            media_by_key = {media_obj.get('media_key'): media_obj for media_obj in includes.get('media', [])}
             
             for media_key in media_keys:
-                for media_obj in media_objects:
-                    if media_obj.get('media_key') == media_key:
-                        media_info = {
-                            'media_key': media_key,
-                            'type': media_obj.get('type'),
-                            'url': media_obj.get('url'),
-                            'preview_image_url': media_obj.get('preview_image_url')
-                        }
-                        media_list.append(media_info)
-                        break
+                media_obj = media_by_key.get(media_key)
+                if media_obj is None:
+                    continue
+                media_list.append({
+                    'media_key': media_key,
+                    'type': media_obj.get('type'),
+                    'url': media_obj.get('url'),
+                    'preview_image_url': media_obj.get('preview_image_url')
+                })
             
         except Exception as e:
-            logger.warning(f"提取媒体信息时出错: {e}")
+            logger.warning("提取媒体信息时出错: %s", e)
         
         return media_list
     
@@ -143,44 +187,33 @@ class DMProcessor:
         
         try:
             # Twitter API返回的是ISO 8601格式
-            return datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            return _iso_to_dt(created_at)
         except Exception as e:
-            logger.warning(f"解析时间戳失败: {e}")
+            logger.warning("解析时间戳失败: %s", e)
             return None
     
     def _format_message(self, message_data: Dict[str, Any]) -> str:
         """格式化私信为Telegram消息"""
         try:
             sender_info = message_data['sender_info']
-            username = sender_info['username']
-            name = sender_info['name']
-            text = message_data['text'] or "[无文本内容]"
             timestamp = message_data['timestamp']
-            message_id = message_data['id']
             
-            # 格式化时间
-            time_str = "未知时间"
-            if timestamp:
-                time_str = timestamp.strftime('%Y-%m-%d %H:%M:%S UTC')
-            
-            # 构建消息
-            formatted_msg = f"""📩 **Twitter私信通知**
-
-👤 **发送者**: @{username} ({name})
-🕒 **时间**: {time_str}
-💬 **内容**: {text}
-
-🔗 **消息ID**: {message_id}"""
+            formatted_msg = _MSG_TEMPLATE.format_map({
+                'username': _md(sender_info['username']),
+                'name': _md(sender_info['name']),
+                'time_str': _md(_fmt_ts(int(timestamp.timestamp())) if timestamp else "未知时间"),
+                'text': _md(message_data['text'] or "[无文本内容]"),
+                'mid': _md(message_data['id']),
+            })
             
             # 如果有媒体，添加媒体信息
-            media = message_data.get('media', [])
+            media = message_data.get('media')
             if media:
-                media_count = len(media)
-                media_types = [m.get('type', 'unknown') for m in media]
-                formatted_msg += f"\n📎 **媒体**: {media_count}个文件 ({', '.join(media_types)})"
+                media_types = _md(', '.join([m.get('type', 'unknown') for m in media]))
+                formatted_msg = "".join((formatted_msg, "\n📎 *媒体*: ", str(len(media)), "个文件 \\(", media_types, "\\)"))
             
             return formatted_msg
             
         except Exception as e:
             logger.error(f"格式化消息时出错: {e}")
-            return f"📩 收到新私信，但格式化失败: {message_data.get('id', 'unknown')}"
\ No newline at end of file
+            return f"📩 收到新私信，但格式化失败: {_md(message_data.get('id', 'unknown'))}"
\ No newline at end of file
@@ -1,141 +1,344 @@
+import asyncio
+import atexit
 import json
 import logging
 import os
-from typing import Set, Optional
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableSet
+from pathlib import Path
+from typing import Dict, Iterable, AbstractSet, List, Optional, Tuple
 from datetime import datetime, timedelta
 from ..utils.error_handler import ErrorHandler
 
+try:
+    import orjson
+    
+    def _dumps(data) -> bytes:
+        return orjson.dumps(data)
+    
+    _loads = orjson.loads
+except ImportError:
+    # 未安装orjson时使用标准库，输出格式一致（紧凑UTF-8）
+    def _dumps(data) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    
+    _loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# 批量写盘：标记后最多延迟这么多秒写入；累计达到上限时立即写入
+_FLUSH_DELAY = 1.0
+_FLUSH_BATCH_SIZE = 50
+
+# 日志文件累计超过该行数时合并回快照文件
+_COMPACT_THRESHOLD = 1000
+
+# 存活的DMStore实例；进程退出时由同一个钩子补写各自未写盘的记录，不延长实例的生命周期
+_live_stores: 'weakref.WeakSet[DMStore]' = weakref.WeakSet()
+
+@atexit.register
+def _flush_stores_at_exit():
+    for store in list(_live_stores):
+        store._flush_at_exit()
+
+def _id_order(message_id: str):
+    """私信ID（snowflake）按数值排序：位数优先，再按字典序"""
+    return len(message_id), message_id
+
+def _cutoff_iso(max_age_days: int) -> str:
+    """过期时间点的ISO字符串，与 datetime.now().isoformat() 生成的时间戳格式一致"""
+    return (datetime.now() - timedelta(days=max_age_days)).isoformat()
+
+def _is_fresh(timestamp_str: Optional[str], cutoff_iso: str) -> bool:
+    """记录是否未过期；同格式的ISO时间戳按字典序比较即按时间比较，无需解析。
+    时间戳缺失时保留该记录"""
+    return not isinstance(timestamp_str, str) or timestamp_str > cutoff_iso
+
+class LRUSet(MutableSet):
+    """容量有限的有序集合 - 超出容量时淘汰最早加入的元素，每个元素可附带一个值（如处理时间）"""
+    
+    __slots__ = ('_d', 'maxsize')
+    
+    def __init__(self, maxsize: int, iterable: Iterable[str] = ()):
+        self._d = OrderedDict()
+        self.maxsize = maxsize
+        for item in iterable:
+            self.add(item)
+    
+    def __contains__(self, item) -> bool:
+        return item in self._d
+    
+    def __iter__(self):
+        return iter(self._d)
+    
+    def __len__(self) -> int:
+        return len(self._d)
+    
+    def add(self, item: str, value=None):
+        """加入元素；已存在时只移到末尾，保留原有的值"""
+        if item in self._d:
+            self._d.move_to_end(item)
+            return
+        self._d[item] = value
+        if len(self._d) > self.maxsize:
+            self._d.popitem(last=False)
+    
+    def items(self):
+        """返回 (元素, 值) 视图"""
+        return self._d.items()
+    
+    def discard(self, item: str):
+        self._d.pop(item, None)
+
 class DMStore:
-    """私信存储管理器 - 负责记录已处理的私信ID，避免重复处理"""
+    """私信存储管理器 - 负责记录已处理的私信ID，避免重复处理
+    
+    持久化由两部分组成：
+    - 快照文件（store_file）：完整的已处理ID及时间戳
+    - 日志文件（store_file + '.log'）：快照之后新增的记录，每行一条JSON，只追加
+    加载时先读快照再重放日志；日志过长、清理或停止时合并回快照。
+    """
     
     def __init__(self, config):
         self.config = config
         self.store_file = getattr(config, 'dm_store_file', 'data/processed_dm_ids.json')
+        self.store_path = getattr(config, 'dm_store_path', None) or Path(self.store_file)
+        self._temp_path = self.store_path.with_name(self.store_path.name + '.tmp')
+        self._journal_path = self.store_path.with_name(self.store_path.name + '.log')
         self.max_age_days = getattr(config, 'dm_store_max_age_days', 7)
-        self.processed_ids: Set[str] = set()
+        # 私信ID随时间递增且有since_id水位线兜底，被淘汰的旧ID不会再被处理
+        self.max_ids = getattr(config, 'dm_store_max_ids', 10000)
+        self.processed_ids = LRUSet(self.max_ids)
+        # 已连续处理完成的最大私信ID，轮询时只关心比它新的私信
+        self.last_seen_id: Optional[str] = None
+        self._loaded = False
         
-        # 确保数据目录存在
-        os.makedirs(os.path.dirname(self.store_file), exist_ok=True)
+        # 尚未写入日志的记录、日志当前行数与写盘任务（同一时间最多一个）
+        self._pending: List[dict] = []
+        self._journal_lines = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        # 攒够一批时通知写盘任务跳过剩余等待
+        self._flush_now = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        # 未经正常停止流程退出时，把尚未写盘的记录补写到日志
+        _live_stores.add(self)
         
-        # 加载已处理的ID
-        self._load_processed_ids()
+        # 确保数据目录存在
+        self.store_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    def preload(self):
+        """将已处理ID一次性载入内存集合，之后的查询不再访问文件（重复调用无副作用）"""
+        if not self._loaded:
+            self._load_processed_ids()
+            self._loaded = True
     
     def is_processed(self, message_id: str) -> bool:
         """检查消息是否已处理"""
         return message_id in self.processed_ids
     
-    def mark_processed(self, message_id: str):
-        """标记消息为已处理"""
+    def processed_set(self) -> AbstractSet[str]:
+        """返回内存中的已处理ID集合（直接返回不复制，调用方只读），供批量过滤使用"""
+        return self.processed_ids
+    
+    async def mark_processed(self, message_id: str):
+        """标记消息为已处理（内存立即生效，写盘批量延迟进行）"""
         try:
-            self.processed_ids.add(message_id)
-            self._save_processed_ids()
+            # ID作为JSON对象的键保存，统一为字符串
+            message_id = str(message_id)
+            timestamp = datetime.now().isoformat()
+            self.processed_ids.add(message_id, timestamp)
+            self._pending.append({'id': message_id, 'ts': timestamp})
+            self._schedule_flush()
             logger.debug(f"标记私信为已处理: {message_id}")
         except Exception as e:
             ErrorHandler.log_error(e, f"标记私信已处理 {message_id}")
     
+    def set_last_seen_id(self, message_id: str):
+        """更新并持久化已处理到的最大私信ID"""
+        if self.last_seen_id is not None and int(message_id) <= int(self.last_seen_id):
+            return
+        self.last_seen_id = str(message_id)
+        self._pending.append({'last_seen_id': self.last_seen_id})
+        self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """记录一次待写盘的变更，攒够一批或延迟到期后在线程中写入文件
+        
+        同一时间只有一个写盘任务；任务已存在时只在攒够一批时唤醒它。
+        """
+        if len(self._pending) >= _FLUSH_BATCH_SIZE:
+            self._flush_now.set()
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self):
+        """等待一小段时间（攒够一批时立即）写盘，写盘期间又有新记录时继续下一轮"""
+        while self._pending:
+            if len(self._pending) < _FLUSH_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), timeout=_FLUSH_DELAY)
+                except asyncio.TimeoutError:
+                    pass
+            self._flush_now.clear()
+            await self.flush()
+    
+    async def flush(self, compact: bool = False):
+        """立即将未写盘的记录追加到日志；日志过长或compact=True时合并回快照（停止监听前调用）"""
+        async with self._write_lock:
+            entries, self._pending = self._pending, []
+            if compact or self._journal_lines + len(entries) > _COMPACT_THRESHOLD:
+                if not entries and not self._journal_lines:
+                    return
+                # 在事件循环线程中生成快照，写文件交给线程池，不阻塞事件循环
+                data = self._snapshot()
+                await asyncio.to_thread(self._compact, data)
+            elif entries:
+                await asyncio.to_thread(self._append_journal, entries)
+    
+    def _flush_at_exit(self):
+        """进程退出时同步写入剩余记录（事件循环已关闭，不再经过线程池）"""
+        if self._pending:
+            entries, self._pending = self._pending, []
+            self._append_journal(entries)
+    
     def get_processed_count(self) -> int:
         """获取已处理消息数量"""
         return len(self.processed_ids)
     
+    def _read_records(self) -> Tuple[Dict[str, str], Optional[str]]:
+        """读取快照并重放日志，返回 {私信ID: 时间戳} 与 last_seen_id"""
+        records: Dict[str, str] = {}
+        last_seen_id = None
+        
+        if os.path.exists(self.store_path):
+            with open(self.store_path, 'rb') as f:
+                data = _loads(f.read())
+            
+            # 支持新格式（带时间戳）和旧格式（仅ID列表）
+            if isinstance(data, dict):
+                last_seen_id = data.get('last_seen_id')
+                records.update(data.get('processed_ids', {}))
+            elif isinstance(data, list):
+                # 旧格式兼容：没有时间戳，按当前时间处理
+                now = datetime.now().isoformat()
+                records.update((str(msg_id), now) for msg_id in data)
+        
+        self._journal_lines = 0
+        if os.path.exists(self._journal_path):
+            with open(self._journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = _loads(line)
+                    except ValueError:
+                        # 异常退出时最后一行可能不完整，跳过
+                        continue
+                    self._journal_lines += 1
+                    # 旧版本可能以int写入ID，重放时统一为字符串
+                    if 'id' in entry:
+                        records.setdefault(str(entry['id']), entry.get('ts'))
+                    elif entry.get('last_seen_id'):
+                        if last_seen_id is None or int(entry['last_seen_id']) > int(last_seen_id):
+                            last_seen_id = str(entry['last_seen_id'])
+        
+        return records, last_seen_id
+    
+    def _build_processed_ids(self, records: Dict[str, str]) -> LRUSet:
+        """过滤过期记录，按ID从旧到新加入（超出容量时只保留最新的部分），保留各自的处理时间"""
+        processed_ids = LRUSet(self.max_ids)
+        for msg_id in self._fresh_ids(records):
+            processed_ids.add(msg_id, records[msg_id])
+        return processed_ids
+    
+    def _fresh_ids(self, records: Dict[str, str]) -> List[str]:
+        """过滤过期记录，按ID从旧到新返回"""
+        cutoff_iso = _cutoff_iso(self.max_age_days)
+        fresh = [msg_id for msg_id, timestamp_str in records.items() if _is_fresh(timestamp_str, cutoff_iso)]
+        return sorted(fresh, key=_id_order)
+    
     def _load_processed_ids(self):
-        """从文件加载已处理的ID"""
+        """从快照和日志加载已处理的ID"""
         try:
-            if os.path.exists(self.store_file):
-                with open(self.store_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    
-                # 支持新格式（带时间戳）和旧格式（仅ID列表）
-                if isinstance(data, dict):
-                    processed_data = data.get('processed_ids', {})
-                    cutoff_time = datetime.now() - timedelta(days=self.max_age_days)
-                    
-                    # 过滤过期的记录
-                    for msg_id, timestamp_str in processed_data.items():
-                        try:
-                            timestamp = datetime.fromisoformat(timestamp_str)
-                            if timestamp > cutoff_time:
-                                self.processed_ids.add(msg_id)
-                        except (ValueError, TypeError):
-                            # 如果时间戳格式有问题，保留这个ID
-                            self.processed_ids.add(msg_id)
-                            
-                elif isinstance(data, list):
-                    # 旧格式兼容
-                    self.processed_ids = set(data)
-                
-                logger.info(f"加载了 {len(self.processed_ids)} 个已处理私信ID")
-            else:
+            if not os.path.exists(self.store_path) and not os.path.exists(self._journal_path):
                 logger.info("私信存储文件不存在，将创建新文件")
+                return
+            
+            records, self.last_seen_id = self._read_records()
+            self.processed_ids = self._build_processed_ids(records)
+            
+            logger.info(f"加载了 {len(self.processed_ids)} 个已处理私信ID（日志 {self._journal_lines} 条）")
                 
         except Exception as e:
-            logger.error(f"加载已处理ID失败: {e}")
-            self.processed_ids = set()
+            ErrorHandler.log_error(e, "加载已处理ID")
+            # 以空集合继续运行，但先把无法加载的文件移开保留，避免下次合并时被空快照覆盖
+            self._preserve_unreadable_files()
+            self.processed_ids = LRUSet(self.max_ids)
+            self.last_seen_id = None
+            self._journal_lines = 0
+    
+    def _preserve_unreadable_files(self):
+        """将无法加载的快照和日志重命名为 *.corrupt-<时间>，供人工检查恢复"""
+        suffix = datetime.now().strftime('%Y%m%d%H%M%S')
+        for path in (self.store_path, self._journal_path):
+            if not os.path.exists(path):
+                continue
+            backup = path.with_name(f"{path.name}.corrupt-{suffix}")
+            try:
+                os.replace(path, backup)
+                logger.error(f"⚠️ 私信存储文件无法加载，已保留为 {backup}，已处理记录从空开始")
+            except Exception as e:
+                ErrorHandler.log_error(e, f"保留私信存储文件 {path}")
+    
+    def _snapshot(self) -> dict:
+        """生成待保存的数据（使用新格式，每个ID保留自己的处理时间）"""
+        return {
+            'version': '1.0',
+            'last_updated': datetime.now().isoformat(),
+            'last_seen_id': self.last_seen_id,
+            'processed_ids': dict(self.processed_ids.items())
+        }
     
-    def _save_processed_ids(self):
-        """保存已处理的ID到文件"""
+    def _append_journal(self, entries: List[dict]):
+        """将一批记录追加到日志文件（每条一行），整批一次写入、一次fsync"""
         try:
-            # 使用新格式，包含时间戳
-            current_time = datetime.now().isoformat()
-            processed_data = {
-                msg_id: current_time for msg_id in self.processed_ids
-            }
-            
-            data = {
-                'version': '1.0',
-                'last_updated': current_time,
-                'processed_ids': processed_data
-            }
-            
-            # 原子写入
-            temp_file = self.store_file + '.tmp'
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            # 替换原文件
-            os.replace(temp_file, self.store_file)
-            
-            logger.debug(f"保存了 {len(self.processed_ids)} 个已处理私信ID")
-            
+            with open(self._journal_path, 'ab') as f:
+                f.write(b''.join(_dumps(entry) + b'\n' for entry in entries))
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_lines += len(entries)
+            logger.debug(f"追加了 {len(entries)} 条私信存储日志")
         except Exception as e:
-            ErrorHandler.log_error(e, "保存已处理ID")
+            ErrorHandler.log_error(e, "追加私信存储日志")
     
-    def cleanup_old_records(self):
-        """清理过期记录"""
+    def _compact(self, data: dict):
+        """写入新快照后清空日志；两步之间异常退出时重放日志也是幂等的"""
+        if not self._write(data):
+            return
         try:
-            if not os.path.exists(self.store_file):
-                return
-            
-            original_count = len(self.processed_ids)
-            cutoff_time = datetime.now() - timedelta(days=self.max_age_days)
+            with open(self._journal_path, 'wb'):
+                pass
+            self._journal_lines = 0
+        except Exception as e:
+            ErrorHandler.log_error(e, "清空私信存储日志")
+    
+    def _write(self, data: dict) -> bool:
+        """将数据原子写入文件，返回是否成功"""
+        try:
+            # 原子写入
+            with open(self._temp_path, 'wb') as f:
+                f.write(_dumps(data))
+                f.flush()
+                os.fsync(f.fileno())
             
-            # 重新加载并过滤
-            with open(self.store_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 替换原文件
+            os.replace(self._temp_path, self.store_path)
             
-            if isinstance(data, dict) and 'processed_ids' in data:
-                processed_data = data['processed_ids']
-                new_processed_ids = set()
-                
-                for msg_id, timestamp_str in processed_data.items():
-                    try:
-                        timestamp = datetime.fromisoformat(timestamp_str)
-                        if timestamp > cutoff_time:
-                            new_processed_ids.add(msg_id)
-                    except (ValueError, TypeError):
-                        # 保留有问题的记录
-                        new_processed_ids.add(msg_id)
-                
-                self.processed_ids = new_processed_ids
-                self._save_processed_ids()
-                
-                cleaned_count = original_count - len(self.processed_ids)
-                if cleaned_count > 0:
-                    logger.info(f"清理了 {cleaned_count} 个过期私信记录")
+            logger.debug(f"保存了 {len(data['processed_ids'])} 个已处理私信ID")
+            return True
             
         except Exception as e:
-            ErrorHandler.log_error(e, "清理过期记录")
+            ErrorHandler.log_error(e, "保存已处理ID")
+            return False
     
     def get_stats(self) -> dict:
         """获取存储统计信息"""
@@ -143,5 +346,7 @@ class DMStore:
             'total_processed': len(self.processed_ids),
             'store_file': self.store_file,
             'max_age_days': self.max_age_days,
-            'file_exists': os.path.exists(self.store_file)
+            'max_ids': self.max_ids,
+            'journal_entries': self._journal_lines,
+            'file_exists': os.path.exists(self.store_path)
         }
\ No newline at end of file
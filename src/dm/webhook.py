@@ -0,0 +1,161 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from aiohttp import web
+from ..utils.error_handler import ErrorHandler
+
+logger = logging.getLogger(__name__)
+
+class DMWebhookReceiver:
+    """Twitter Account Activity webhook接收器 - 私信由Twitter主动推送，无需轮询
+
+    - GET  请求：CRC校验，返回 response_token
+    - POST 请求：校验 x-twitter-webhooks-signature 后，将 direct_message_events
+      转换为与轮询相同的消息格式，交给 DMMonitor 处理
+
+    webhook URL需要事先在Twitter开发者后台（Account Activity API）注册并订阅账号。
+    """
+
+    def __init__(self, dm_monitor, consumer_secret: str, port: int = 8081, path: str = '/webhooks/twitter'):
+        self.dm_monitor = dm_monitor
+        self._secret = consumer_secret.encode('utf-8')
+        self.port = port
+        self.path = path
+        self.app = web.Application()
+        self.app.router.add_get(path, self._crc_check)
+        self.app.router.add_post(path, self._handle_event)
+        self.runner = None
+        # 处理中的推送任务，保证快速响应Twitter并在停止时统一等待
+        self._tasks = set()
+
+    def _sign(self, payload: bytes) -> str:
+        """计算 sha256=<base64(HMAC-SHA256)> 签名"""
+        digest = hmac.new(self._secret, payload, hashlib.sha256).digest()
+        return 'sha256=' + base64.b64encode(digest).decode('ascii')
+
+    async def _crc_check(self, request):
+        """响应Twitter的CRC挑战"""
+        crc_token = request.query.get('crc_token')
+        if not crc_token:
+            return web.json_response({'error': 'missing crc_token'}, status=400)
+        return web.json_response({'response_token': self._sign(crc_token.encode('utf-8'))})
+
+    async def _handle_event(self, request):
+        """接收推送事件，校验签名后异步处理，立即返回200"""
+        body = await request.read()
+        signature = request.headers.get('x-twitter-webhooks-signature', '')
+        if not hmac.compare_digest(signature, self._sign(body)):
+            logger.warning("⚠️ webhook签名校验失败，已拒绝请求")
+            return web.Response(status=403)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        if not isinstance(payload, dict):
+            return web.Response(status=400)
+
+        messages = self._extract_messages(payload)
+        if messages:
+            logger.info(f"📨 webhook收到 {len(messages)} 条私信")
+            task = asyncio.create_task(self.dm_monitor.process_pushed_messages(messages))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        return web.Response(status=200)
+
+    def _extract_messages(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """将 direct_message_events 转换为轮询接口的消息格式，忽略自己发出的私信"""
+        events = payload.get('direct_message_events')
+        if not events:
+            return []
+
+        for_user_id = payload.get('for_user_id')
+        users = payload.get('users', {})
+        messages = []
+        for event in events:
+            message = self._convert_event(event, users)
+            if message and message['sender_id'] != for_user_id:
+                messages.append(message)
+        return messages
+
+    @staticmethod
+    def _convert_event(event: Dict[str, Any], users: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """转换单个 message_create 事件"""
+        if event.get('type') != 'message_create':
+            return None
+
+        message_create = event.get('message_create', {})
+        message_data = message_create.get('message_data', {})
+        sender_id = message_create.get('sender_id')
+
+        created_at = None
+        timestamp_ms = event.get('created_timestamp')
+        if timestamp_ms:
+            created_at = datetime.fromtimestamp(int(timestamp_ms) / 1000, timezone.utc).isoformat()
+
+        message = {
+            'id': event.get('id'),
+            'text': message_data.get('text', ''),
+            'created_at': created_at,
+            'sender_id': sender_id,
+            'includes': {},
+        }
+
+        user = users.get(sender_id)
+        if user:
+            message['includes']['users'] = [{
+                'id': sender_id,
+                'username': user.get('screen_name'),
+                'name': user.get('name'),
+                'profile_image_url': user.get('profile_image_url_https'),
+            }]
+
+        media = (message_data.get('attachment') or {}).get('media')
+        if media:
+            media_key = media.get('id_str')
+            url = media.get('media_url_https')
+            # 视频/GIF取码率最高的mp4，图片直接使用media_url
+            variants = [v for v in (media.get('video_info') or {}).get('variants', [])
+                        if v.get('content_type') == 'video/mp4']
+            if variants:
+                url = max(variants, key=lambda v: v.get('bitrate', 0))['url']
+            message['attachments'] = {'media_keys': [media_key]}
+            message['includes']['media'] = [{
+                'media_key': media_key,
+                'type': media.get('type'),
+                'url': url,
+                'preview_image_url': media.get('media_url_https'),
+            }]
+
+        return message
+
+    async def start(self):
+        """启动webhook服务器"""
+        try:
+            self.runner = web.AppRunner(self.app)
+            await self.runner.setup()
+            site = web.TCPSite(self.runner, "0.0.0.0", self.port)
+            await site.start()
+            logger.info(f"📡 私信webhook接收器启动在端口 {self.port}，路径 {self.path}")
+        except Exception as e:
+            ErrorHandler.log_error(e, "启动私信webhook")
+            raise
+
+    async def stop(self):
+        """停止webhook服务器，并等待处理中的推送完成"""
+        try:
+            # 先停止接收新的推送，再等待已接收的推送处理完成
+            if self.runner:
+                await self.runner.cleanup()
+                logger.info("私信webhook接收器已停止")
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+                await self.dm_monitor.dm_store.flush()
+        except Exception as e:
+            ErrorHandler.log_error(e, "停止私信webhook")
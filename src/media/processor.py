@@ -1,13 +1,38 @@
 import os
+import asyncio
 import logging
 import tempfile
 import aiohttp
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union
 from PIL import Image
 import io
 
 logger = logging.getLogger(__name__)
 
+# 流式下载的分块大小
+_DOWNLOAD_CHUNK_SIZE = 65536
+
+# 文件头魔数 -> 图片格式（与Pillow的img.format小写一致）
+_MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+# 超限图片压缩时可选的JPEG质量（从低到高），在其中二分查找满足大小限制的最高质量
+_QUALITY_STEPS = tuple(range(30, 90, 5))
+_DEFAULT_QUALITY = 85
+
+def detect_image_format(header: bytes) -> Optional[str]:
+    """根据文件头（前16字节即可）识别图片格式，无法识别时返回None"""
+    for magic, image_format in _MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
 class MediaProcessor:
     def __init__(self, config):
         self.config = config
@@ -15,82 +40,187 @@ class MediaProcessor:
         self.supported_formats = getattr(config, 'supported_image_formats', ['jpg', 'jpeg', 'png', 'gif'])
         self.temp_dir = getattr(config, 'temp_dir', './temp')
         self.media_timeout = getattr(config, 'media_upload_timeout', 30)
+        # 进程内复用的下载会话，保持到图片CDN的连接池
+        self._session: Optional[aiohttp.ClientSession] = None
         
         # 创建临时目录
         os.makedirs(self.temp_dir, exist_ok=True)
     
-    async def download_file(self, file_url: str, session: aiohttp.ClientSession) -> Optional[bytes]:
-        """下载文件并返回字节数据"""
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取（首次调用时创建）共享的下载会话"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+    
+    async def close(self):
+        """关闭共享的下载会话"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def download_file(self, file_url: str, session: aiohttp.ClientSession) -> Optional[str]:
+        """流式下载文件到临时目录并返回路径，超过大小限制时立即中止"""
+        temp_path = None
         try:
             async with session.get(file_url, timeout=aiohttp.ClientTimeout(total=self.media_timeout)) as response:
-                if response.status == 200:
-                    file_data = await response.read()
-                    
-                    if len(file_data) > self.max_image_size:
-                        logger.warning(f"文件大小超过限制: {len(file_data)} bytes")
-                        return None
-                    
-                    return file_data
-                else:
+                if response.status != 200:
                     logger.error(f"下载文件失败，状态码: {response.status}")
                     return None
+                
+                # 响应头已表明超限时不再下载
+                if response.content_length and response.content_length > self.max_image_size:
+                    logger.warning(f"文件大小超过限制: {response.content_length} bytes")
+                    return None
+                
+                size = 0
+                with tempfile.NamedTemporaryFile(dir=self.temp_dir, suffix='.download', delete=False) as temp_file:
+                    temp_path = temp_file.name
+                    async for chunk in response.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.max_image_size:
+                            break
+                        temp_file.write(chunk)
+                
+                if size > self.max_image_size:
+                    logger.warning(f"文件大小超过限制，已中止下载: 超过 {self.max_image_size} bytes")
+                    self.cleanup_temp_file(temp_path)
+                    return None
+                
+                return temp_path
                     
         except Exception as e:
             logger.error(f"下载文件时出错: {e}")
+            if temp_path:
+                self.cleanup_temp_file(temp_path)
             return None
     
-    def validate_image_format(self, file_data: bytes) -> bool:
-        """验证图片格式"""
+    @staticmethod
+    def _open_image(source: Union[str, bytes]):
+        """打开图片：路径直接交给Pillow读取，字节数据包装为BytesIO"""
+        return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    
+    def validate_image_format(self, source: Union[str, bytes]) -> bool:
+        """验证图片格式（source为文件路径或字节数据），只检查文件头魔数，不解码图片"""
         try:
-            with Image.open(io.BytesIO(file_data)) as img:
-                format_lower = img.format.lower() if img.format else 'unknown'
-                return format_lower in self.supported_formats
+            if isinstance(source, bytes):
+                header = source[:16]
+            else:
+                with open(source, 'rb') as f:
+                    header = f.read(16)
+            return detect_image_format(header) in self.supported_formats
         except Exception as e:
             logger.error(f"验证图片格式时出错: {e}")
             return False
     
-    def optimize_image(self, file_data: bytes, max_size: int = None) -> bytes:
-        """优化图片大小和质量"""
+    def process_one(self, source: Union[str, bytes], in_memory: bool = False) -> Optional[Tuple[Union[str, bytes], int]]:
+        """一次解码完成格式校验、模式转换与JPEG编码，直接写入临时文件
+        
+        返回 (临时文件路径, 文件大小)；in_memory=True时不落盘，返回 (JPEG字节数据, 大小)。
+        格式不支持或处理失败时返回None。source为下载的临时文件路径且可直接使用时，
+        该文件会被移动为输出文件。
+        """
+        output_path = None
         try:
-            max_size = max_size or self.max_image_size
+            source_size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+            
+            # 未超限的JPEG无需重新编码，直接使用原始数据
+            if source_size <= self.max_image_size and self._is_supported_jpeg(source):
+                if isinstance(source, bytes):
+                    data = source
+                elif in_memory:
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                else:
+                    # 下载文件本身就是最终结果，同一目录内重命名即可，无需复制
+                    output_path = self._new_temp_path('jpg')
+                    os.replace(source, output_path)
+                    return output_path, source_size
+                return (data if in_memory else self.save_temp_file(data, 'jpg')), source_size
             
-            with Image.open(io.BytesIO(file_data)) as img:
+            with self._open_image(source) as img:
+                format_lower = img.format.lower() if img.format else 'unknown'
+                if format_lower not in self.supported_formats:
+                    logger.warning(f"不支持的图片格式: {format_lower}")
+                    return None
+                
                 # 转换为RGB（如果需要）
                 if img.mode in ('RGBA', 'LA', 'P'):
                     img = img.convert('RGB')
                 
-                # 如果文件已经足够小，直接返回
-                if len(file_data) <= max_size:
-                    output = io.BytesIO()
-                    img.save(output, format='JPEG', quality=85, optimize=True)
-                    return output.getvalue()
+                # 原文件未超限时按默认质量编码一次即可；否则二分查找满足大小限制的质量
+                quality = _DEFAULT_QUALITY
+                if source_size > self.max_image_size:
+                    quality = self._find_quality(img)
                 
-                # 计算缩放比例
-                quality = 85
-                while True:
+                # 只有最终输出使用optimize=True（Huffman优化较慢，且只会让文件更小）
+                if in_memory:
                     output = io.BytesIO()
                     img.save(output, format='JPEG', quality=quality, optimize=True)
-                    compressed_data = output.getvalue()
-                    
-                    if len(compressed_data) <= max_size or quality <= 30:
-                        return compressed_data
-                    
-                    quality -= 10
+                    return output.getvalue(), output.tell()
+                
+                output_path = self._new_temp_path('jpg')
+                img.save(output_path, format='JPEG', quality=quality, optimize=True)
+                return output_path, os.path.getsize(output_path)
                 
         except Exception as e:
-            logger.error(f"优化图片时出错: {e}")
-            return file_data
+            logger.error(f"处理图片时出错: {e}")
+            if output_path:
+                self.cleanup_temp_file(output_path)
+            return None
+    
+    def _find_quality(self, img) -> int:
+        """二分查找编码后不超过大小限制的最高质量，均不满足时返回最低质量
+        
+        试编码不开启optimize，结果偏大，因此按找到的质量做最终编码一定满足限制。
+        """
+        lo, hi = 0, len(_QUALITY_STEPS) - 1
+        best = _QUALITY_STEPS[0]
+        probe = io.BytesIO()
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            probe.seek(0)
+            probe.truncate()
+            img.save(probe, format='JPEG', quality=_QUALITY_STEPS[mid])
+            if probe.tell() <= self.max_image_size:
+                best = _QUALITY_STEPS[mid]
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return best
+    
+    def _is_supported_jpeg(self, source: Union[str, bytes]) -> bool:
+        """根据文件头判断是否为允许的JPEG"""
+        if not ({'jpg', 'jpeg'} & set(self.supported_formats)):
+            return False
+        if isinstance(source, bytes):
+            header = source[:16]
+        else:
+            with open(source, 'rb') as f:
+                header = f.read(16)
+        return detect_image_format(header) == 'jpeg'
+    
+    def _new_temp_path(self, extension: str) -> str:
+        """在临时目录中创建一个空文件并返回路径"""
+        fd, path = tempfile.mkstemp(suffix=f'.{extension}', dir=self.temp_dir)
+        os.close(fd)
+        return path
     
     def save_temp_file(self, file_data: bytes, extension: str = 'jpg') -> str:
         """保存临时文件并返回文件路径"""
         try:
-            with tempfile.NamedTemporaryFile(
-                dir=self.temp_dir, 
-                suffix=f'.{extension}', 
-                delete=False
-            ) as temp_file:
-                temp_file.write(file_data)
-                return temp_file.name
+            # 只写一次，直接用文件描述符，省去缓冲文件对象的开销
+            fd, path = tempfile.mkstemp(suffix=f'.{extension}', dir=self.temp_dir)
+            try:
+                view = memoryview(file_data)
+                while view:
+                    view = view[os.write(fd, view):]
+            except Exception:
+                os.close(fd)
+                self.cleanup_temp_file(path)
+                raise
+            os.close(fd)
+            return path
         except Exception as e:
             logger.error(f"保存临时文件时出错: {e}")
             raise
@@ -98,55 +228,71 @@ class MediaProcessor:
     def cleanup_temp_file(self, file_path: str):
         """清理临时文件"""
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.debug(f"清理临时文件: {file_path}")
+            os.remove(file_path)
+            logger.debug(f"清理临时文件: {file_path}")
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.error(f"清理临时文件时出错: {e}")
     
-    async def process_images(self, file_urls: List[str]) -> List[Dict[str, Any]]:
-        """处理多个图片文件"""
+    async def process_images(self, file_urls: List[str], in_memory: bool = False) -> List[Dict[str, Any]]:
+        """处理多个图片文件（并发下载，编码在线程池中并行进行）
+        
+        默认结果中的 temp_path 为优化后的临时文件；in_memory=True 时改为 data（JPEG字节数据），
+        适合处理后立即上传的场景，省去一次写盘、读回和删除。
+        """
         if len(file_urls) > 4:
             raise ValueError("最多支持4张图片")
         
-        processed_images = []
-        
-        async with aiohttp.ClientSession() as session:
-            for i, file_url in enumerate(file_urls):
-                try:
-                    # 下载文件
-                    file_data = await self.download_file(file_url, session)
-                    if not file_data:
-                        logger.warning(f"跳过无法下载的文件: {file_url}")
-                        continue
-                    
-                    # 验证格式
-                    if not self.validate_image_format(file_data):
-                        logger.warning(f"跳过不支持的图片格式: {file_url}")
-                        continue
-                    
-                    # 优化图片
-                    optimized_data = self.optimize_image(file_data)
-                    
-                    # 保存临时文件
-                    temp_path = self.save_temp_file(optimized_data, 'jpg')
-                    
-                    processed_images.append({
-                        'index': i,
-                        'temp_path': temp_path,
-                        'size': len(optimized_data),
-                        'original_url': file_url
-                    })
-                    
-                    logger.info(f"成功处理图片 {i+1}/{len(file_urls)}: {temp_path}")
-                    
-                except Exception as e:
-                    logger.error(f"处理图片时出错: {e}")
-                    continue
+        session = self._get_session()
+        results = await asyncio.gather(*(
+            self._process_image(session, i, file_url, len(file_urls), in_memory)
+            for i, file_url in enumerate(file_urls)
+        ))
         
-        return processed_images
+        # gather保持输入顺序，结果按原始图片顺序排列
+        return [image_info for image_info in results if image_info]
+    
+    async def process_single_image(self, file_url: str, index: int = 0, total: int = 1,
+                                   in_memory: bool = False) -> Optional[Dict[str, Any]]:
+        """下载并处理单张图片（调用方可在URL就绪后立即开始），结果格式同 process_images，失败时返回None"""
+        return await self._process_image(self._get_session(), index, file_url, total, in_memory)
+    
+    async def _process_image(self, session: aiohttp.ClientSession, i: int, file_url: str,
+                             total: int, in_memory: bool = False) -> Optional[Dict[str, Any]]:
+        """下载并处理单张图片，失败时返回None"""
+        download_path = None
+        try:
+            # 下载文件
+            download_path = await self.download_file(file_url, session)
+            if not download_path:
+                logger.warning(f"跳过无法下载的文件: {file_url}")
+                return None
+            
+            # 校验格式并优化，一次解码直接写出临时文件（Pillow编码时释放GIL，可多核并行）
+            result = await asyncio.to_thread(self.process_one, download_path, in_memory)
+            if not result:
+                logger.warning(f"跳过无法处理的图片: {file_url}")
+                return None
+            output, size = result
+            
+            logger.info(f"成功处理图片 {i+1}/{total}: {'内存' if in_memory else output}")
+            return {
+                'index': i,
+                'data' if in_memory else 'temp_path': output,
+                'size': size,
+                'original_url': file_url
+            }
+            
+        except Exception as e:
+            logger.error(f"处理图片时出错: {e}")
+            return None
+        finally:
+            if download_path:
+                self.cleanup_temp_file(download_path)
     
     def cleanup_processed_images(self, processed_images: List[Dict[str, Any]]):
         """清理所有处理过的图片文件"""
         for image_info in processed_images:
-            self.cleanup_temp_file(image_info['temp_path'])
\ No newline at end of file
+            if image_info.get('temp_path'):
+                self.cleanup_temp_file(image_info['temp_path'])
\ No newline at end of file
@@ -1,34 +1,56 @@
 import logging
+import io
 import tweepy
-from typing import List, Dict, Any, Optional
-import os
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Union
 
 logger = logging.getLogger(__name__)
 
+# 所有上传共用的线程池，大小与v1.1会话连接池一致（单条推文最多4个媒体）
+_UPLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix='media-upload')
+
+@lru_cache(maxsize=1)
+def _get_v1_api(consumer_key: str, consumer_secret: str, access_token: str, access_token_secret: str) -> tweepy.API:
+    """按凭据缓存API v1.1客户端（媒体上传用），会话连接池可容纳4个并发上传"""
+    auth = tweepy.OAuth1UserHandler(
+        consumer_key=consumer_key,
+        consumer_secret=consumer_secret,
+        access_token=access_token,
+        access_token_secret=access_token_secret
+    )
+    api = tweepy.API(auth)
+    api.session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return api
+
 class MediaUploader:
     def __init__(self, twitter_client):
         self.client = twitter_client.client  # tweepy.Client
-        # 初始化API v1.1客户端用于媒体上传
-        auth = tweepy.OAuth1UserHandler(
-            consumer_key=twitter_client.credentials['consumer_key'],
-            consumer_secret=twitter_client.credentials['consumer_secret'],
-            access_token=twitter_client.credentials['access_token'],
-            access_token_secret=twitter_client.credentials['access_token_secret']
+        # 获取API v1.1客户端用于媒体上传（同一凭据只创建一次）
+        credentials = twitter_client.credentials
+        self.api = _get_v1_api(
+            credentials['consumer_key'],
+            credentials['consumer_secret'],
+            credentials['access_token'],
+            credentials['access_token_secret']
         )
-        self.api = tweepy.API(auth)
     
-    def upload_media(self, file_path: str) -> Optional[str]:
-        """上传单个媒体文件并返回media_id"""
+    def upload_media(self, file_path: Union[str, bytes]) -> Optional[str]:
+        """上传单个媒体（文件路径或内存中的JPEG数据）并返回media_id"""
         try:
-            if not os.path.exists(file_path):
-                logger.error(f"文件不存在: {file_path}")
-                return None
-            
             # 使用Twitter API v1.1上传媒体
-            media = self.api.media_upload(file_path)
+            if isinstance(file_path, bytes):
+                media = self.api.media_upload(filename='image.jpg', file=io.BytesIO(file_path))
+            else:
+                # 直接打开文件，不存在时由 FileNotFoundError 处理，省去一次stat
+                media = self.api.media_upload(file_path)
             logger.info(f"媒体上传成功: {media.media_id}")
             return str(media.media_id)
             
+        except FileNotFoundError:
+            logger.error(f"文件不存在: {file_path}")
+            return None
         except tweepy.TooManyRequests as e:
             logger.warning(f"媒体上传频率限制: {e}")
             raise
@@ -42,8 +64,8 @@ class MediaUploader:
             logger.error(f"媒体上传失败: {e}")
             return None
     
-    def upload_multiple_media(self, file_paths: List[str]) -> List[str]:
-        """上传多个媒体文件并返回media_ids列表"""
+    def upload_multiple_media(self, file_paths: List[Union[str, bytes]]) -> List[str]:
+        """并行上传多个媒体文件并返回media_ids列表（顺序与file_paths一致）"""
         if len(file_paths) > 4:
             raise ValueError("最多支持4个媒体文件")
         
@@ -51,14 +73,17 @@ class MediaUploader:
         uploaded_files = []
         
         try:
-            for file_path in file_paths:
-                media_id = self.upload_media(file_path)
+            # 上传是阻塞的网络请求，用共享线程池并行发出；map按输入顺序返回结果
+            results = list(_UPLOAD_EXECUTOR.map(self.upload_media, file_paths))
+            
+            for index, (file_path, media_id) in enumerate(zip(file_paths, results), 1):
+                name = f"内存图片#{index}" if isinstance(file_path, bytes) else file_path
                 if media_id:
                     media_ids.append(media_id)
-                    uploaded_files.append(file_path)
-                    logger.info(f"成功上传媒体: {file_path} -> {media_id}")
+                    uploaded_files.append(name)
+                    logger.info(f"成功上传媒体: {name} -> {media_id}")
                 else:
-                    logger.warning(f"跳过上传失败的文件: {file_path}")
+                    logger.warning(f"跳过上传失败的文件: {name}")
             
             if not media_ids:
                 raise Exception("没有成功上传任何媒体文件")
@@ -1,8 +1,13 @@
 import logging
+from typing import Optional
+from urllib.parse import urlparse
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 
 logger = logging.getLogger(__name__)
 
+# 非命令文本消息的组合过滤器，模块加载时构建一次
+_TEXT_NOT_CMD = filters.TEXT & ~filters.COMMAND
+
 class TelegramBot:
     def __init__(self, token: str, handlers):
         self.token = token
@@ -11,33 +16,29 @@ class TelegramBot:
     
     def setup_handlers(self):
         """设置命令和消息处理器"""
-        # 命令处理器
-        self.application.add_handler(CommandHandler("start", self.handlers.start))
-        self.application.add_handler(CommandHandler("help", self.handlers.help))
-        self.application.add_handler(CommandHandler("status", self.handlers.status))
-        self.application.add_handler(CommandHandler("dm_status", self.handlers.dm_status))
-        
-        # 消息处理器（处理非命令的文本消息，包括私信）
-        self.application.add_handler(
-            MessageHandler(filters.TEXT & ~filters.COMMAND, self.handlers.handle_message)
-        )
-        
-        # 图片和文档处理器
-        self.application.add_handler(
-            MessageHandler(filters.PHOTO, self.handlers.handle_photo)
-        )
-        self.application.add_handler(
-            MessageHandler(filters.Document.ALL, self.handlers.handle_document)
-        )
-        
+        handlers = [
+            # 命令处理器
+            CommandHandler("start", self.handlers.start),
+            CommandHandler("help", self.handlers.help),
+            CommandHandler("status", self.handlers.status),
+            CommandHandler("dm_status", self.handlers.dm_status),
+            
+            # 消息处理器（处理非命令的文本消息，包括私信）
+            MessageHandler(_TEXT_NOT_CMD, self.handlers.handle_message),
+            
+            # 图片和文档处理器
+            MessageHandler(filters.PHOTO, self.handlers.handle_photo),
+            MessageHandler(filters.Document.ALL, self.handlers.handle_document),
+        ]
         
         # 按钮回调处理器（如果启用确认功能）
         if hasattr(self.handlers, 'button_handler') and self.handlers.button_handler:
-            self.application.add_handler(
-                CallbackQueryHandler(self.handlers.button_handler.handle_callback)
-            )
+            handlers.append(CallbackQueryHandler(self.handlers.button_handler.handle_callback))
             logger.info("已注册确认按钮处理器")
         
+        # 一次性注册到默认分组
+        self.application.add_handlers(handlers)
+        
         # 全局错误处理器
         self.application.add_error_handler(self.handlers.error_handler)
         
@@ -59,6 +60,8 @@ class TelegramBot:
         try:
             await self.application.start()
             await self.application.updater.start_polling(
+                timeout=30,                 # 长轮询等待时间，减少getUpdates请求次数
+                allowed_updates=['message', 'callback_query'],  # 只接收需要的更新类型
                 drop_pending_updates=True,  # 跳过待处理的更新
                 read_timeout=30,            # 读取超时时间
                 write_timeout=30,           # 写入超时时间
@@ -70,6 +73,28 @@ class TelegramBot:
             logger.error(f"启动轮询失败: {e}")
             raise
     
+    async def start_webhook(self, url: str, port: int, secret_token: Optional[str] = None):
+        """通过webhook接收更新（Telegram主动推送，没有长轮询的等待间隔）
+        
+        url为Telegram可访问的公网HTTPS地址，本地监听路径与其路径部分一致；
+        需要安装 python-telegram-bot[webhooks]。
+        """
+        try:
+            await self.application.start()
+            await self.application.updater.start_webhook(
+                listen='0.0.0.0',
+                port=port,
+                url_path=urlparse(url).path.lstrip('/'),
+                webhook_url=url,
+                secret_token=secret_token,
+                allowed_updates=['message', 'callback_query'],  # 只接收需要的更新类型
+                drop_pending_updates=True   # 跳过待处理的更新
+            )
+            logger.info(f"Telegram机器人开始通过webhook接收更新，端口 {port}")
+        except Exception as e:
+            logger.error(f"启动webhook失败: {e}")
+            raise
+    
     async def stop(self):
         """停止机器人"""
         try:
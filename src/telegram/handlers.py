@@ -1,13 +1,33 @@
+import asyncio
 import logging
+import sys
+import time
+from dataclasses import dataclass, field
 from telegram import Update
 from telegram.ext import ContextTypes
-from typing import Callable, Any, List
+from typing import Awaitable, Callable, Any, Dict, List, Optional
 from ..utils.exceptions import AuthorizationError, TwitterAPIError
 from ..utils.error_handler import ErrorHandler
 from ..media.processor import MediaProcessor
 
 logger = logging.getLogger(__name__)
 
+# 相册中的图片通常在约200毫秒内陆续到达，最后一张到达后静默这么久即开始处理
+_MEDIA_GROUP_DEBOUNCE = 0.3
+
+# /status 中所有健康检查的总超时（秒）
+_HEALTH_CHECK_TIMEOUT = 5.0
+
+@dataclass(slots=True)
+class _MediaGroup:
+    """收集中的媒体组（相册）"""
+    photos: List[str]
+    caption: str
+    user_id: int
+    chat_id: int
+    first_message_id: int
+    last_arrival: float = field(default_factory=time.monotonic)  # 最近一张图片到达的单调时钟时间
+
 class TelegramHandlers:
     def __init__(self, twitter_client, auth_service, config):
         self.twitter_client = twitter_client
@@ -15,6 +35,53 @@ class TelegramHandlers:
         self.config = config
         self.media_processor = MediaProcessor(config)
         
+        # 运行期间不变的配置项，初始化时取值一次
+        self._max_image_size = getattr(config, 'max_image_size', 5242880)  # 5MB
+        self._max_image_mb = self._max_image_size // 1024 // 1024
+        self._dm_enabled = getattr(config, 'enable_dm_monitoring', False)
+        self._dm_poll_interval = getattr(config, 'dm_poll_interval', 60)
+        self._dm_target = getattr(config, 'dm_target_chat_id', None)
+        
+        # 欢迎和帮助文本只依赖配置，预先生成；欢迎语仅需拼接用户名
+        self._welcome_prefix = "🎉 欢迎使用 Twitter Bot！\n\n👤 授权用户: "
+        self._welcome_suffix = (
+            f"\n📝 直接发送消息即可发布到Twitter\n"
+            f"📏 消息长度限制: {config.tweet_max_length}字符\n\n"
+            f"使用 /help 查看更多命令"
+        )
+        self._help_text = f"""📖 使用帮助
+
+基本命令：
+• /start - 开始使用机器人
+• /help - 显示此帮助信息
+• /status - 检查服务状态
+
+发送推文：
+• 直接发送文本消息即可发布到Twitter
+• 消息长度限制：{config.tweet_max_length}字符
+• 支持中英文混合内容
+
+发送图片推文：
+• 发送单张或多张图片（最多4张）
+• 支持格式：JPG, PNG, GIF
+• 文件大小限制：{self._max_image_mb}MB
+• 可以添加图片说明文字
+• 多张图片：选择多张图片一起发送
+
+DM监听功能：
+• /dm_status - 查看私信监听状态
+• 自动监听Twitter私信并转发到此聊天
+• 监听间隔：{self._dm_poll_interval}秒
+
+注意事项：
+• 只有授权用户可以使用此机器人
+• 请遵守Twitter使用条款
+• 发送前请仔细检查内容
+• 支持私信和群聊消息
+
+💡 提示：点击上方命令即可直接执行
+🔗 发送成功后会返回推文链接"""
+        
         # 确认功能组件（稍后由主程序设置）
         self.confirmation_manager = None
         self.preview_generator = None
@@ -22,7 +89,6 @@ class TelegramHandlers:
         
         # 媒体组处理缓存
         self.media_groups = {}
-        import asyncio
         self.media_group_tasks = {}
     
     def set_confirmation_components(self, confirmation_manager, preview_generator, button_handler):
@@ -38,99 +104,96 @@ class TelegramHandlers:
         return True
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.message
+        user = update.effective_user
         try:
-            self._check_authorization(update.effective_user.id)
+            self._check_authorization(user.id)
             
-            welcome_msg = (
-                f"🎉 欢迎使用 Twitter Bot！\n\n"
-                f"👤 授权用户: {update.effective_user.first_name}\n"
-                f"📝 直接发送消息即可发布到Twitter\n"
-                f"📏 消息长度限制: {self.config.tweet_max_length}字符\n\n"
-                f"使用 /help 查看更多命令"
-            )
-            await update.message.reply_text(welcome_msg)
+            welcome_msg = "".join((self._welcome_prefix, user.first_name, self._welcome_suffix))
+            await message.reply_text(welcome_msg)
             
         except AuthorizationError:
-            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            await message.reply_text("❌ 你没有权限使用此机器人。")
         except Exception as e:
             ErrorHandler.log_error(e, "start命令")
-            await update.message.reply_text("❌ 服务暂时不可用，请稍后重试。")
+            await message.reply_text("❌ 服务暂时不可用，请稍后重试。")
     
     async def help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.message
         try:
             self._check_authorization(update.effective_user.id)
             
-            help_text = f"""📖 使用帮助
-
-基本命令：
-• /start - 开始使用机器人
-• /help - 显示此帮助信息
-• /status - 检查服务状态
-
-发送推文：
-• 直接发送文本消息即可发布到Twitter
-• 消息长度限制：{self.config.tweet_max_length}字符
-• 支持中英文混合内容
-
-发送图片推文：
-• 发送单张或多张图片（最多4张）
-• 支持格式：JPG, PNG, GIF
-• 文件大小限制：{self.config.max_image_size // 1024 // 1024}MB
-• 可以添加图片说明文字
-• 多张图片：选择多张图片一起发送
-
-DM监听功能：
-• /dm_status - 查看私信监听状态
-• 自动监听Twitter私信并转发到此聊天
-• 监听间隔：{getattr(self.config, 'dm_poll_interval', 60)}秒
-
-注意事项：
-• 只有授权用户可以使用此机器人
-• 请遵守Twitter使用条款
-• 发送前请仔细检查内容
-• 支持私信和群聊消息
-
-💡 提示：点击上方命令即可直接执行
-🔗 发送成功后会返回推文链接"""
-            await update.message.reply_text(help_text)
+            await message.reply_text(self._help_text)
             
         except AuthorizationError:
-            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            await message.reply_text("❌ 你没有权限使用此机器人。")
         except Exception as e:
             ErrorHandler.log_error(e, "help命令")
-            await update.message.reply_text("❌ 无法显示帮助信息。")
+            await message.reply_text("❌ 无法显示帮助信息。")
     
     async def status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """检查服务状态"""
+        message = update.message
         try:
             self._check_authorization(update.effective_user.id)
             
-            # 显示Twitter API状态（避免实际API调用以防止速率限制）
-            twitter_status = "⚠️ 待验证（首次使用时验证）"
+            # 并发执行所有健康检查，总耗时取决于最慢的一项而不是各项之和
+            probes = self._health_probes()
+            try:
+                results = await asyncio.wait_for(
+                    asyncio.gather(*probes.values(), return_exceptions=True),
+                    timeout=_HEALTH_CHECK_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                results = [asyncio.TimeoutError()] * len(probes)
+            probe_lines = "".join(
+                f"{name}: {'❌ 异常' if isinstance(result, Exception) else result}\n"
+                for name, result in zip(probes, results)
+            )
             
             status_msg = (
                 f"🔧 **服务状态**\n\n"
-                f"Twitter API: {twitter_status}\n"
+                f"{probe_lines}"
                 f"机器人状态: ✅ 运行中\n"
                 f"配置状态: ✅ 已加载\n"
                 f"推文长度限制: {self.config.tweet_max_length}字符"
             )
-            await update.message.reply_text(status_msg, parse_mode='Markdown')
+            await message.reply_text(status_msg, parse_mode='Markdown')
             
         except AuthorizationError:
-            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            await message.reply_text("❌ 你没有权限使用此机器人。")
         except Exception as e:
             ErrorHandler.log_error(e, "status命令")
-            await update.message.reply_text("❌ 无法获取状态信息。")
+            await message.reply_text("❌ 无法获取状态信息。")
+    
+    def _health_probes(self) -> Dict[str, Awaitable[str]]:
+        """/status 的健康检查项（显示名称 -> 返回状态文本的协程），新增检查项在此注册即可"""
+        probes = {'Twitter API': self._probe_twitter()}
+        if self.confirmation_manager:
+            probes['确认请求'] = self._probe_confirmations()
+        return probes
+    
+    async def _probe_twitter(self) -> str:
+        """Twitter连接状态（只读取缓存的验证结果，避免实际API调用以防止速率限制）"""
+        verified = self.twitter_client.connection_verified
+        if verified is None:
+            return "⚠️ 待验证（首次使用时验证）"
+        return "✅ 正常" if verified else "❌ 验证失败"
+    
+    async def _probe_confirmations(self) -> str:
+        """确认请求状态"""
+        stats = self.confirmation_manager.get_stats()
+        return f"✅ {stats['pending_confirmations']} 个待确认"
     
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.message
         try:
             self._check_authorization(update.effective_user.id)
             
-            message_text = update.message.text.strip()
+            message_text = message.text.strip()
             
             if not message_text:
-                await update.message.reply_text("❌ 消息内容不能为空。")
+                await message.reply_text("❌ 消息内容不能为空。")
                 return
             
             # 检查是否启用确认功能
@@ -144,27 +207,28 @@ DM监听功能：
                 await self._handle_direct_send(update, message_text)
                 
         except AuthorizationError:
-            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            await message.reply_text("❌ 你没有权限使用此机器人。")
         except Exception as e:
             ErrorHandler.log_error(e, "消息处理")
             error_msg = ErrorHandler.format_user_error(e)
-            await update.message.reply_text(error_msg)
+            await message.reply_text(error_msg)
     
     async def _handle_with_confirmation(self, update: Update, message_text: str):
         """使用确认机制处理消息"""
+        message = update.message
         try:
             # 创建确认请求
             confirmation_key = self.confirmation_manager.create_confirmation(
                 user_id=update.effective_user.id,
                 chat_id=update.effective_chat.id,
-                message_id=update.message.message_id,
+                message_id=message.message_id,
                 text=message_text
             )
             
             # 获取确认请求
             pending_tweet = self.confirmation_manager.get_confirmation(confirmation_key)
             if not pending_tweet:
-                await update.message.reply_text("❌ 创建确认请求失败")
+                await message.reply_text("❌ 创建确认请求失败")
                 return
             
             # 生成预览消息
@@ -174,7 +238,7 @@ DM监听功能：
             keyboard = self.button_handler.create_confirmation_keyboard(confirmation_key)
             
             # 发送确认消息
-            await update.message.reply_text(
+            await message.reply_text(
                 preview_text,
                 parse_mode='Markdown',
                 reply_markup=keyboard
@@ -182,39 +246,60 @@ DM监听功能：
             
         except Exception as e:
             ErrorHandler.log_error(e, "确认消息处理")
-            await update.message.reply_text("❌ 处理确认请求时发生错误")
+            await message.reply_text("❌ 处理确认请求时发生错误")
+    
+    async def _fetch_and_process_images(self, file_ids: List[str], bot) -> Optional[List[Dict[str, Any]]]:
+        """获取文件URL与下载处理流水线执行：任一文件URL就绪即开始下载处理该图片
+        
+        返回按原始顺序排列的处理结果（图片数据保留在内存中）；没有任何文件URL可用时返回None。
+        """
+        if len(file_ids) > 4:
+            raise ValueError("最多支持4张图片")
+        
+        async def get_indexed_file(index: int, file_id: str):
+            return index, await bot.get_file(file_id)
+        
+        total = len(file_ids)
+        process_tasks = []
+        for next_file in asyncio.as_completed([get_indexed_file(i, file_id) for i, file_id in enumerate(file_ids)]):
+            try:
+                index, file = await next_file
+            except Exception as e:
+                logger.error(f"获取文件URL失败: {e}")
+                continue
+            process_tasks.append(asyncio.create_task(
+                self.media_processor.process_single_image(file.file_path, index, total, in_memory=True)
+            ))
+        
+        if not process_tasks:
+            return None
+        
+        results = await asyncio.gather(*process_tasks)
+        return sorted((image_info for image_info in results if image_info), key=lambda image_info: image_info['index'])
+    
+    async def load_media(self, file_ids: List[str], bot) -> List[bytes]:
+        """按Telegram file_id下载并处理图片，返回可直接上传的JPEG数据（确认发送时使用）"""
+        processed_images = await self._fetch_and_process_images(file_ids, bot)
+        return [image_info['data'] for image_info in processed_images or []]
     
     async def _handle_media_with_confirmation(self, update: Update, file_ids: List[str], 
                                             text: str, media_type: str, context: ContextTypes.DEFAULT_TYPE):
         """使用确认机制处理媒体消息"""
+        message = update.message
         try:
-            # 获取文件URL
-            file_urls = []
-            for file_id in file_ids:
-                try:
-                    file = await context.bot.get_file(file_id)
-                    file_urls.append(file.file_path)
-                except Exception as e:
-                    logger.error(f"获取文件URL失败: {e}")
-                    continue
-            
-            if not file_urls:
-                await update.message.reply_text("❌ 无法获取文件，请重试。")
-                return
-            
-            # 创建确认请求
+            # 创建确认请求；只保存file_id，文件URL中包含bot token，确认发送时再获取
             confirmation_key = self.confirmation_manager.create_confirmation(
                 user_id=update.effective_user.id,
                 chat_id=update.effective_chat.id,
-                message_id=update.message.message_id,
+                message_id=message.message_id,
                 text=text,
-                media_files=file_urls
+                media_files=list(file_ids)
             )
             
             # 获取确认请求
             pending_tweet = self.confirmation_manager.get_confirmation(confirmation_key)
             if not pending_tweet:
-                await update.message.reply_text("❌ 创建确认请求失败")
+                await message.reply_text("❌ 创建确认请求失败")
                 return
             
             # 生成预览消息
@@ -224,7 +309,7 @@ DM监听功能：
             keyboard = self.button_handler.create_confirmation_keyboard(confirmation_key)
             
             # 发送确认消息
-            await update.message.reply_text(
+            await message.reply_text(
                 preview_text,
                 parse_mode='Markdown',
                 reply_markup=keyboard
@@ -232,60 +317,68 @@ DM监听功能：
             
         except Exception as e:
             ErrorHandler.log_error(e, f"{media_type}确认消息处理")
-            await update.message.reply_text("❌ 处理确认请求时发生错误")
+            await message.reply_text("❌ 处理确认请求时发生错误")
     
     async def _handle_media_group_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE, media_group_id: str):
         """处理媒体组中的图片"""
-        import asyncio
+        # 同一相册的每张图片都带有相同的media_group_id，驻留后字典查找可直接按对象同一性命中
+        media_group_id = sys.intern(media_group_id)
         
         # 获取图片信息
-        photos = update.message.photo
+        message = update.message
+        photos = message.photo
         largest_photo = max(photos, key=lambda x: x.file_size)
-        caption = update.message.caption or ""
+        caption = message.caption or ""
         
-        # 初始化媒体组缓存
-        if media_group_id not in self.media_groups:
-            self.media_groups[media_group_id] = {
-                'photos': [],
-                'caption': caption,  # 使用第一张图片的说明文字
-                'user_id': update.effective_user.id,
-                'chat_id': update.effective_chat.id,
-                'first_message_id': update.message.message_id
-            }
+        media_group = self.media_groups.get(media_group_id)
+        if media_group is None:
+            # 第一张图片：初始化媒体组缓存，并启动唯一的等待任务
+            media_group = self.media_groups[media_group_id] = _MediaGroup(
+                photos=[],
+                caption=caption,  # 使用第一张图片的说明文字
+                user_id=update.effective_user.id,
+                chat_id=update.effective_chat.id,
+                first_message_id=message.message_id
+            )
+            self.media_group_tasks[media_group_id] = asyncio.create_task(
+                self._process_media_group_delayed(update, context, media_group_id)
+            )
+        else:
+            # 后续图片只刷新到达时间，等待任务会相应延后
+            media_group.last_arrival = time.monotonic()
         
         # 添加图片到媒体组
-        self.media_groups[media_group_id]['photos'].append(largest_photo.file_id)
+        media_group.photos.append(largest_photo.file_id)
         
         # 如果说明文字为空但当前有说明文字，则更新
-        if not self.media_groups[media_group_id]['caption'] and caption:
-            self.media_groups[media_group_id]['caption'] = caption
-        
-        # 取消之前的延迟任务
-        if media_group_id in self.media_group_tasks:
-            self.media_group_tasks[media_group_id].cancel()
-        
-        # 创建新的延迟任务（等待1秒收集完所有图片）
-        self.media_group_tasks[media_group_id] = asyncio.create_task(
-            self._process_media_group_delayed(update, context, media_group_id)
-        )
+        if not media_group.caption and caption:
+            media_group.caption = caption
     
     async def _process_media_group_delayed(self, update: Update, context: ContextTypes.DEFAULT_TYPE, media_group_id: str):
         """延迟处理媒体组"""
         try:
-            # 等待1秒收集所有图片
-            await asyncio.sleep(1.0)
-            
-            if media_group_id not in self.media_groups:
+            media_group = self.media_groups.get(media_group_id)
+            if media_group is None:
                 return
             
-            media_group = self.media_groups[media_group_id]
-            photos = media_group['photos']
-            caption = media_group['caption']
+            # 等到最后一张图片到达后静默 _MEDIA_GROUP_DEBOUNCE 秒，说明相册已收齐
+            while True:
+                remaining = _MEDIA_GROUP_DEBOUNCE - (time.monotonic() - media_group.last_arrival)
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+            
+            # 先移出缓存，处理期间迟到的图片会作为新的媒体组处理而不是被丢失
+            self.media_groups.pop(media_group_id, None)
+            self.media_group_tasks.pop(media_group_id, None)
+            
+            photos = media_group.photos
+            caption = media_group.caption
             
             # 限制最多4张图片
             if len(photos) > 4:
                 photos = photos[:4]
-                caption += f"\n\n⚠️ 只处理前4张图片（共{len(media_group['photos'])}张）"
+                caption += f"\n\n⚠️ 只处理前4张图片（共{len(media_group.photos)}张）"
             
             logger.info(f"处理媒体组: {media_group_id}, 图片数量: {len(photos)}")
             
@@ -305,24 +398,21 @@ DM监听功能：
                     f"{len(photos)}张图片",
                     context
                 )
-            
-            # 清理缓存
-            del self.media_groups[media_group_id]
-            if media_group_id in self.media_group_tasks:
-                del self.media_group_tasks[media_group_id]
                 
         except Exception as e:
             ErrorHandler.log_error(e, "媒体组处理")
-            if media_group_id in self.media_groups:
-                del self.media_groups[media_group_id]
-            if media_group_id in self.media_group_tasks:
-                del self.media_group_tasks[media_group_id]
+            self.media_groups.pop(media_group_id, None)
+            self.media_group_tasks.pop(media_group_id, None)
+    
+    @staticmethod
+    async def _reply_or_edit(update: Update, status_msg, text: str, **kwargs):
+        """有处理状态消息时将其编辑为最终结果，否则直接回复结果"""
+        if status_msg:
+            return await status_msg.edit_text(text, **kwargs)
+        return await update.message.reply_text(text, **kwargs)
     
     async def _handle_direct_send(self, update: Update, message_text: str):
-        """直接发送推文（原逻辑）"""
-        # 显示处理状态
-        status_msg = await update.message.reply_text("⏳ 正在发送推文...")
-        
+        """直接发送推文（原逻辑）；纯文本推文很快完成，不发送处理状态消息，直接回复结果"""
         # 发送推文
         result = await self.twitter_client.create_tweet(message_text)
         
@@ -333,30 +423,31 @@ DM监听功能：
                 f"📝 内容: {result['text']}\n"
                 f"🔗 链接: {result['url']}"
             )
-            await status_msg.edit_text(success_msg, parse_mode='Markdown')
+            await update.message.reply_text(success_msg, parse_mode='Markdown')
         else:
             error_msg = ErrorHandler.format_user_error(Exception(result.get('error', '未知错误')))
-            await status_msg.edit_text(error_msg)
+            await update.message.reply_text(error_msg)
     
     async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理图片消息"""
+        message = update.message
         try:
             self._check_authorization(update.effective_user.id)
             
             # 获取消息中的图片
-            photos = update.message.photo
+            photos = message.photo
             if not photos:
-                await update.message.reply_text("❌ 没有找到图片。")
+                await message.reply_text("❌ 没有找到图片。")
                 return
             
             # 检查是否是媒体组的一部分
-            media_group_id = update.message.media_group_id
+            media_group_id = message.media_group_id
             if media_group_id:
                 await self._handle_media_group_photo(update, context, media_group_id)
             else:
                 # 单张图片处理
                 largest_photo = max(photos, key=lambda x: x.file_size)
-                caption = update.message.caption or ""
+                caption = message.caption or ""
                 
                 # 检查是否启用确认功能
                 if (self.confirmation_manager and 
@@ -376,35 +467,35 @@ DM监听功能：
                     )
             
         except AuthorizationError:
-            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            await message.reply_text("❌ 你没有权限使用此机器人。")
         except Exception as e:
             ErrorHandler.log_error(e, "图片处理")
             error_msg = ErrorHandler.format_user_error(e)
-            await update.message.reply_text(error_msg)
+            await message.reply_text(error_msg)
     
     async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """处理文档消息（包括图片文件）"""
+        message = update.message
         try:
             self._check_authorization(update.effective_user.id)
             
-            document = update.message.document
+            document = message.document
             if not document:
-                await update.message.reply_text("❌ 没有找到文档。")
+                await message.reply_text("❌ 没有找到文档。")
                 return
             
             # 检查是否为图片文件
             if not document.mime_type or not document.mime_type.startswith('image/'):
-                await update.message.reply_text("❌ 只支持图片文件。")
+                await message.reply_text("❌ 只支持图片文件。")
                 return
             
             # 检查文件大小
-            max_size = getattr(self.config, 'max_image_size', 5242880)  # 5MB
-            if document.file_size and document.file_size > max_size:
-                await update.message.reply_text(f"❌ 文件大小超过限制（{max_size // 1024 // 1024}MB）。")
+            if document.file_size and document.file_size > self._max_image_size:
+                await message.reply_text(f"❌ 文件大小超过限制（{self._max_image_mb}MB）。")
                 return
             
             # 获取标题文本
-            caption = update.message.caption or ""
+            caption = message.caption or ""
             
             await self._process_media_message(
                 update, 
@@ -415,42 +506,35 @@ DM监听功能：
             )
             
         except AuthorizationError:
-            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            await message.reply_text("❌ 你没有权限使用此机器人。")
         except Exception as e:
             ErrorHandler.log_error(e, "文档处理")
             error_msg = ErrorHandler.format_user_error(e)
-            await update.message.reply_text(error_msg)
+            await message.reply_text(error_msg)
     
     async def _process_media_message(self, update: Update, file_ids: List[str], text: str, media_type: str, context: ContextTypes.DEFAULT_TYPE):
         """处理媒体消息的通用方法"""
+        message = update.message
         try:
-            # 显示处理状态
-            status_msg = await update.message.reply_text(f"⏳ 正在处理{media_type}并发送推文...")
-            
-            # 获取文件URL
-            file_urls = []
-            for file_id in file_ids:
-                try:
-                    file = await context.bot.get_file(file_id)
-                    file_urls.append(file.file_path)
-                except Exception as e:
-                    logger.error(f"获取文件URL失败: {e}")
-                    continue
-            
-            if not file_urls:
-                await status_msg.edit_text("❌ 无法获取文件，请重试。")
-                return
+            # 多张图片处理耗时较长才显示处理状态，单张图片直接回复最终结果
+            status_msg = None
+            if len(file_ids) > 1:
+                status_msg = await message.reply_text(f"⏳ 正在处理{media_type}并发送推文...")
+            
+            # 获取文件URL并处理图片（结果保留在内存中直接上传，不经过临时文件）
+            processed_images = await self._fetch_and_process_images(file_ids, context.bot)
             
-            # 处理图片
-            processed_images = await self.media_processor.process_images(file_urls)
+            if processed_images is None:
+                await self._reply_or_edit(update, status_msg, "❌ 无法获取文件，请重试。")
+                return
             
             if not processed_images:
-                await status_msg.edit_text("❌ 没有可用的图片文件。")
+                await self._reply_or_edit(update, status_msg, "❌ 没有可用的图片文件。")
                 return
             
             try:
-                # 获取图片文件路径
-                image_paths = [img['temp_path'] for img in processed_images]
+                # 获取图片数据
+                image_paths = [img['data'] for img in processed_images]
                 
                 # 发送带媒体的推文
                 result = await self.twitter_client.create_tweet_with_media(text, image_paths)
@@ -463,10 +547,10 @@ DM监听功能：
                         f"🖼️ 图片数量: {result.get('media_count', len(image_paths))}\n"
                         f"🔗 链接: {result['url']}"
                     )
-                    await status_msg.edit_text(success_msg, parse_mode='Markdown')
+                    await self._reply_or_edit(update, status_msg, success_msg, parse_mode='Markdown')
                 else:
                     error_msg = ErrorHandler.format_user_error(Exception(result.get('error', '未知错误')))
-                    await status_msg.edit_text(error_msg)
+                    await self._reply_or_edit(update, status_msg, error_msg)
                     
             finally:
                 # 清理临时文件
@@ -475,7 +559,7 @@ DM监听功能：
         except Exception as e:
             ErrorHandler.log_error(e, f"{media_type}消息处理")
             error_msg = ErrorHandler.format_user_error(e)
-            await update.message.reply_text(error_msg)
+            await message.reply_text(error_msg)
     
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """全局错误处理器"""
@@ -488,29 +572,26 @@ DM监听功能：
     
     async def dm_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """显示DM监听状态"""
+        message = update.message
         try:
             self._check_authorization(update.effective_user.id)
             
             # 这里需要从主程序获取DM监听器状态
             # 暂时显示配置信息
-            dm_enabled = getattr(self.config, 'enable_dm_monitoring', False)
-            dm_interval = getattr(self.config, 'dm_poll_interval', 60)
-            dm_target = getattr(self.config, 'dm_target_chat_id', None)
-            
             status_msg = f"""🔍 **DM监听状态**
 
-⚙️ **功能状态**: {'✅ 启用' if dm_enabled else '❌ 禁用'}
-⏱️ **轮询间隔**: {dm_interval}秒
-📱 **目标聊天**: {dm_target if dm_target else '未设置'}
+⚙️ **功能状态**: {'✅ 启用' if self._dm_enabled else '❌ 禁用'}
+⏱️ **轮询间隔**: {self._dm_poll_interval}秒
+📱 **目标聊天**: {self._dm_target if self._dm_target else '未设置'}
 
 💡 **说明**: 
 DM监听功能会定期检查您的Twitter私信，并将新消息转发到指定的Telegram聊天中。
 """
             
-            await update.message.reply_text(status_msg, parse_mode='Markdown')
+            await message.reply_text(status_msg, parse_mode='Markdown')
             
         except AuthorizationError:
-            await update.message.reply_text("❌ 你没有权限使用此机器人。")
+            await message.reply_text("❌ 你没有权限使用此机器人。")
         except Exception as e:
             ErrorHandler.log_error(e, "dm_status命令")
-            await update.message.reply_text("❌ 无法获取DM状态信息。")
\ No newline at end of file
+            await message.reply_text("❌ 无法获取DM状态信息。")
\ No newline at end of file
@@ -1,10 +1,10 @@
+import asyncio
 import logging
 import time
-import os
 import tweepy
 import requests
 import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 from ..utils.exceptions import TwitterAPIError, RateLimitError
 from ..utils.error_handler import handle_errors, ErrorHandler
 from ..utils.rate_limiter import get_rate_limiter
@@ -19,6 +19,7 @@ class TwitterClient:
         self.credentials = credentials
         self.config = config
         self._client = None
+        self._http = None
         self._connection_verified = None
         self._dm_access_verified = None
         
@@ -44,8 +45,7 @@ class TwitterClient:
             self._media_uploader = None
             
             # 检查是否跳过验证
-            skip_verification = config and getattr(config, 'skip_twitter_verification', False)
-            if skip_verification or os.getenv('SKIP_TWITTER_VERIFICATION', '').lower() == 'true':
+            if config and getattr(config, 'skip_twitter_verification', False):
                 logger.info("⚡ 快速启动模式：跳过API验证")
             
             logger.info("✅ Twitter客户端初始化成功（延迟模式）")
@@ -72,6 +72,30 @@ class TwitterClient:
                 raise TwitterAPIError(f"Twitter客户端初始化失败: {e}")
         return self._client
     
+    @property
+    def http(self) -> requests.Session:
+        """DM API使用的HTTP会话（延迟创建），复用连接以免每次请求重新握手"""
+        if self._http is None:
+            self._http = requests.Session()
+            self._http.mount('https://', requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=10))
+        return self._http
+    
+    def close(self):
+        """关闭HTTP会话"""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+    
+    @property
+    def connection_verified(self) -> Optional[bool]:
+        """最近一次连接验证的缓存结果（未验证时为None），不会触发API调用"""
+        return self._connection_verified
+    
+    @property
+    def dm_access_verified(self) -> Optional[bool]:
+        """最近一次DM权限验证的缓存结果（未验证时为None），不会触发API调用"""
+        return self._dm_access_verified
+    
     @property
     def media_uploader(self):
         """获取媒体上传器（延迟初始化）"""
@@ -155,8 +179,8 @@ class TwitterClient:
             raise TwitterAPIError(f"❌ Twitter服务暂时不可用，请稍后再试")
     
     @handle_errors("带媒体推文发送失败")
-    async def create_tweet_with_media(self, text: str, image_paths: List[str]) -> Dict[str, Any]:
-        """创建带有图片的推文"""
+    async def create_tweet_with_media(self, text: str, image_paths: List[Union[str, bytes]]) -> Dict[str, Any]:
+        """创建带有图片的推文（图片为文件路径或内存中的JPEG数据）"""
         try:
             if not self.validate_tweet_length(text):
                 raise TwitterAPIError(f"推文长度超过{self.max_length}字符限制")
@@ -173,14 +197,14 @@ class TwitterClient:
             if not connection_ok:
                 raise TwitterAPIError("⏳ Twitter API已达到每日限制，请24小时后再试")
             
-            # 上传媒体文件
-            media_ids = self.media_uploader.upload_multiple_media(image_paths)
+            # 上传媒体文件（阻塞的网络请求放到线程中执行，不阻塞事件循环）
+            media_ids = await asyncio.to_thread(self.media_uploader.upload_multiple_media, image_paths)
             
             if not media_ids:
                 raise TwitterAPIError("没有成功上传任何图片")
             
             # 创建带媒体的推文
-            result = self.media_uploader.create_tweet_with_media(text, media_ids)
+            result = await asyncio.to_thread(self.media_uploader.create_tweet_with_media, text, media_ids)
             
             logger.info(f"带媒体的推文创建成功: {result['tweet_id']}")
             return result
@@ -224,10 +248,6 @@ class TwitterClient:
             logger.info("⏭️ 跳过Twitter连接验证（配置禁用）")
             return True
             
-        if os.getenv('SKIP_TWITTER_VERIFICATION', '').lower() == 'true':
-            logger.info("⏭️ 跳过Twitter连接验证（环境变量禁用）")
-            return True
-            
         if self._connection_verified is not None:
             return self._connection_verified
         
@@ -271,6 +291,14 @@ class TwitterClient:
             'Content-Type': 'application/json'
         }
     
+    @staticmethod
+    def _rate_limit_reset(headers) -> Optional[float]:
+        """从响应头读取频率限制窗口的结束时间"""
+        try:
+            return float(headers['x-rate-limit-reset'])
+        except (KeyError, TypeError, ValueError):
+            return None
+    
     def _process_dm_response(self, response: requests.Response) -> List[Dict[str, Any]]:
         """处理DM API响应"""
         if response.status_code == 200:
@@ -314,7 +342,8 @@ class TwitterClient:
             
         elif response.status_code == 429:
             logger.warning("私信API频率限制")
-            raise RateLimitError("私信API调用过于频繁，请稍后重试")
+            raise RateLimitError("私信API调用过于频繁，请稍后重试",
+                                 reset_at=self._rate_limit_reset(response.headers))
             
         elif response.status_code == 403:
             error_data = response.json()
@@ -355,7 +384,7 @@ class TwitterClient:
             if next_token:
                 params['pagination_token'] = next_token
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self.http.get(url, headers=headers, params=params)
             messages = self._process_dm_response(response)
             
             # 处理分页信息
@@ -367,6 +396,8 @@ class TwitterClient:
             logger.info(f"获取到 {len(messages)} 条DM事件")
             return result
             
+        except TwitterAPIError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"私信API网络错误: {e}")
             raise TwitterAPIError(f"网络错误: {e}")
@@ -395,7 +426,7 @@ class TwitterClient:
             if next_token:
                 params['pagination_token'] = next_token
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self.http.get(url, headers=headers, params=params)
             messages = self._process_dm_response(response)
             
             result = {
@@ -406,6 +437,8 @@ class TwitterClient:
             logger.info(f"获取到与用户 {participant_id} 的 {len(messages)} 条对话")
             return result
             
+        except TwitterAPIError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"私信API网络错误: {e}")
             raise TwitterAPIError(f"网络错误: {e}")
@@ -434,7 +467,7 @@ class TwitterClient:
             if next_token:
                 params['pagination_token'] = next_token
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self.http.get(url, headers=headers, params=params)
             messages = self._process_dm_response(response)
             
             result = {
@@ -445,6 +478,8 @@ class TwitterClient:
             logger.info(f"获取到对话 {conversation_id} 的 {len(messages)} 条消息")
             return result
             
+        except TwitterAPIError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"私信API网络错误: {e}")
             raise TwitterAPIError(f"网络错误: {e}")
@@ -453,10 +488,20 @@ class TwitterClient:
             raise TwitterAPIError(f"获取对话消息失败: {e}")
     
     # 主要的私信获取方法，支持多种实现方式
-    async def get_direct_messages(self, max_results: int = 100) -> List[Dict[str, Any]]:
+    async def get_direct_messages(self, max_results: int = 100, since_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         获取私信（优先使用高级DM API，回退到tweepy实现）
+        
+        since_id: 只返回ID大于该值的私信（DM事件ID随时间递增）
         """
+        messages = await self._fetch_direct_messages(max_results)
+        if since_id and messages:
+            since = int(since_id)
+            messages = [m for m in messages if int(m.get('id') or 0) > since]
+        return messages
+    
+    async def _fetch_direct_messages(self, max_results: int) -> List[Dict[str, Any]]:
+        """获取最近私信的实际实现"""
         try:
             # 按需验证DM访问权限
             dm_access_ok = await self.test_dm_access()
@@ -485,7 +530,8 @@ class TwitterClient:
                 messages = []
                 for dm_event in response.data:
                     message_dict = {
-                        'id': dm_event.id,
+                        # 与DM API返回的格式一致，ID统一为字符串（也是私信存储中的键）
+                        'id': str(dm_event.id),
                         'text': dm_event.text,
                         'created_at': dm_event.created_at.isoformat() if dm_event.created_at else None,
                         'sender_id': dm_event.sender_id,
@@ -526,7 +572,11 @@ class TwitterClient:
                 
         except tweepy.TooManyRequests as e:
             logger.warning(f"私信API频率限制: {e}")
-            raise RateLimitError("⏳ Twitter API已达到每日限制，请24小时后再试")
+            raise RateLimitError("⏳ Twitter API已达到每日限制，请24小时后再试",
+                                 reset_at=self._rate_limit_reset(getattr(e.response, 'headers', None)))
+        
+        except TwitterAPIError:
+            raise
         
         except tweepy.Forbidden as e:
             logger.error(f"私信API禁止访问: {e}")
@@ -547,10 +597,6 @@ class TwitterClient:
             logger.info("⏭️ 跳过DM API验证（配置禁用）")
             return True
             
-        if os.getenv('SKIP_TWITTER_VERIFICATION', '').lower() == 'true':
-            logger.info("⏭️ 跳过DM API验证（环境变量禁用）")
-            return True
-            
         if self._dm_access_verified is not None:
             return self._dm_access_verified
         
@@ -612,7 +658,7 @@ class TwitterClient:
                 ]
             
             # 发送请求
-            response = requests.post(url, headers=headers, json=data)
+            response = self.http.post(url, headers=headers, json=data)
             
             if response.status_code == 201:
                 result = response.json()
@@ -632,6 +678,8 @@ class TwitterClient:
                 logger.error(f"私信发送失败: {response.status_code} - {error_msg}")
                 raise TwitterAPIError(f"发送私信失败: {error_msg}")
                 
+        except TwitterAPIError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"私信API网络错误: {e}")
             raise TwitterAPIError(f"网络错误: {e}")
@@ -667,7 +715,7 @@ class TwitterClient:
                 ]
             
             # 发送请求
-            response = requests.post(url, headers=headers, json=data)
+            response = self.http.post(url, headers=headers, json=data)
             
             if response.status_code == 201:
                 result = response.json()
@@ -683,6 +731,8 @@ class TwitterClient:
                 logger.error(f"创建私信对话失败: {response.status_code} - {error_data}")
                 raise TwitterAPIError(f"创建私信对话失败: {error_data.get('title', '未知错误')}")
                 
+        except TwitterAPIError:
+            raise
         except requests.exceptions.RequestException as e:
             logger.error(f"私信API网络错误: {e}")
             raise TwitterAPIError(f"网络错误: {e}")
@@ -729,7 +779,7 @@ class TwitterClient:
             if next_token:
                 params['pagination_token'] = next_token
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self.http.get(url, headers=headers, params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -22,4 +22,7 @@ class AuthorizationError(BotException):
 
 class RateLimitError(TwitterAPIError):
     """频率限制错误异常"""
-    pass
\ No newline at end of file
+    def __init__(self, message: str, status_code: int = 429, reset_at: float = None):
+        super().__init__(message, status_code)
+        # 限制窗口结束的Unix时间戳（来自x-rate-limit-reset响应头），未知时为None
+        self.reset_at = reset_at
\ No newline at end of file
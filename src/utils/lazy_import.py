@@ -0,0 +1,39 @@
+import importlib
+import os
+from typing import Any
+
+# CI等场景可设置 TG_TWITTER_EAGER_IMPORT=1 立即导入所有延迟模块，尽早暴露导入错误
+EAGER_IMPORT = os.getenv('TG_TWITTER_EAGER_IMPORT', '').lower() in ('1', 'true')
+
+
+class LazyImport:
+    """延迟导入代理 - 首次访问属性或调用时才真正导入模块"""
+
+    def __init__(self, module_name: str):
+        self._module_name = module_name
+        self._module = None
+
+    def _load(self) -> Any:
+        """导入并缓存目标模块"""
+        if self._module is None:
+            self._module = importlib.import_module(self._module_name)
+        return self._module
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._load(), name)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        state = "已加载" if self._module is not None else "未加载"
+        return f"<LazyImport {self._module_name} ({state})>"
+
+
+def lazy_import(module_name: str) -> LazyImport:
+    """创建模块的延迟导入代理，例如 lazy_import("PIL.Image")"""
+    proxy = LazyImport(module_name)
+    if EAGER_IMPORT:
+        proxy._load()
+    return proxy
+
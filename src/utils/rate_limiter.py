@@ -176,6 +176,28 @@ class RateLimiter:
         
         return wrapper
 
+class TokenBucket:
+    """异步令牌桶 - 限制每秒调用次数，允许不超过capacity的突发"""
+    
+    def __init__(self, rate: float, capacity: int = None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """获取一个令牌，令牌不足时等待"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
 # 全局速率限制器实例
 _rate_limiter = None
 
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from src.dm.store import DMStore
+
+
+class _Config:
+    def __init__(self, store_file):
+        self.dm_store_file = store_file
+
+
+class DMStoreIdTest(unittest.TestCase):
+    """私信ID可能以int形式传入（tweepy回退实现），写盘与重新加载后必须仍能去重"""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.config = _Config(os.path.join(self._tmp.name, 'processed_dm_ids.json'))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _reload(self) -> DMStore:
+        store = DMStore(self.config)
+        store.preload()
+        return store
+
+    def test_int_id_round_trip_through_snapshot(self):
+        async def run():
+            store = self._reload()
+            await store.mark_processed(1234567890123)
+            await store.flush(compact=True)
+
+        asyncio.run(run())
+        self.assertTrue(os.path.exists(self.config.dm_store_file))
+        self.assertTrue(self._reload().is_processed('1234567890123'))
+
+    def test_int_id_round_trip_through_journal(self):
+        async def run():
+            store = self._reload()
+            await store.mark_processed(1234567890123)
+            await store.flush()
+
+        asyncio.run(run())
+        self.assertTrue(self._reload().is_processed('1234567890123'))
+
+    def test_int_id_journal_lines_from_older_versions_reload(self):
+        journal = self.config.dm_store_file + '.log'
+        with open(journal, 'w', encoding='utf-8') as f:
+            f.write('{"id":1234567890123,"ts":"2999-01-01T00:00:00"}\n')
+            f.write('{"last_seen_id":1234567890123}\n')
+
+        store = self._reload()
+        self.assertTrue(store.is_processed('1234567890123'))
+        self.assertEqual(store.last_seen_id, '1234567890123')
+
+    def test_unreadable_store_is_preserved(self):
+        with open(self.config.dm_store_file, 'w', encoding='utf-8') as f:
+            f.write('{"processed_ids": {"1": "2999-01-01T00:00:00"')
+
+        store = self._reload()
+        self.assertEqual(store.get_processed_count(), 0)
+        self.assertFalse(os.path.exists(self.config.dm_store_file))
+        backups = [name for name in os.listdir(self._tmp.name) if '.corrupt-' in name]
+        self.assertEqual(len(backups), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+环境配置预编译工具
+
+将 .env 解析为带类型的Python字面量，生成 src/config/env_cache.py，
+进程启动时 Config 直接导入该模块，无需再解析 .env 文件。
+
+使用方法：
+1. 在部署前准备好 .env 文件
+2. 运行此脚本: python tools/build_env_cache.py [.env路径]
+3. 生成的 src/config/env_cache.py 包含 .env 中的全部密钥，请勿提交到版本库，
+   也绝不能打包进镜像（已列入 .dockerignore）；它只用于在部署主机上直接运行的进程，
+   容器部署请通过环境变量传入配置
+
+修改 .env 后需要重新运行此脚本；真实环境变量始终优先于缓存值。
+"""
+
+import sys
+import pprint
+import logging
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+OUTPUT_FILE = project_root / 'src' / 'config' / 'env_cache.py'
+
+# 与 Config 字段类型保持一致，未列出的键按字符串保存
+INT_KEYS = {
+    'HEALTH_PORT', 'TELEGRAM_WEBHOOK_PORT', 'TWEET_MAX_LENGTH', 'MAX_IMAGE_SIZE', 'MEDIA_UPLOAD_TIMEOUT',
+    'DM_POLL_INTERVAL', 'DM_MAX_POLL_INTERVAL', 'DM_STORE_MAX_AGE_DAYS', 'DM_STORE_MAX_IDS', 'DM_CONCURRENCY', 'DM_DIGEST_THRESHOLD', 'DM_WEBHOOK_PORT', 'CONFIRMATION_TIMEOUT',
+    'CONFIRMATION_BUTTON_TIMEOUT', 'RATE_LIMIT_MAX_RETRIES', 'RATE_LIMIT_CACHE_TTL',
+}
+FLOAT_KEYS = {'RATE_LIMIT_MIN_INTERVAL', 'RATE_LIMIT_BACKOFF_FACTOR', 'DM_IDLE_BACKOFF_FACTOR'}
+BOOL_KEYS = {
+    'ENABLE_DM_MONITORING', 'SEND_STARTUP_NOTIFICATION', 'ENABLE_CONFIRMATION',
+    'REQUIRE_CONFIRMATION_FOR_ALL', 'RATE_LIMIT_ENABLE_CACHE', 'DRY_RUN_MODE',
+    'SKIP_TWITTER_VERIFICATION', 'PERSIST_CONFIRMATIONS',
+}
+LIST_KEYS = {'SUPPORTED_IMAGE_FORMATS'}
+
+def coerce(key: str, value: str):
+    """按字段类型转换单个配置值"""
+    if key in INT_KEYS:
+        return int(value)
+    if key in FLOAT_KEYS:
+        return float(value)
+    if key in BOOL_KEYS:
+        return value.lower() == 'true'
+    if key in LIST_KEYS:
+        return value.split(',')
+    return value
+
+def main():
+    env_file = Path(sys.argv[1]) if len(sys.argv) > 1 else project_root / '.env'
+    if not env_file.exists():
+        logger.error(f"找不到环境文件: {env_file}")
+        sys.exit(1)
+
+    values = {}
+    for key, value in dotenv_values(env_file).items():
+        if value is None:
+            continue
+        try:
+            values[key] = coerce(key, value)
+        except ValueError:
+            logger.error(f"{key} 的值无法转换: {value!r}")
+            sys.exit(1)
+
+    OUTPUT_FILE.write_text(
+        "# 由 tools/build_env_cache.py 自动生成，请勿手动修改或提交\n\n"
+        f"VALUES = {pprint.pformat(values, sort_dicts=True)}\n",
+        encoding='utf-8'
+    )
+    logger.info(f"已生成 {OUTPUT_FILE}（{len(values)} 项）")
+
+    # 生成后立即执行一次完整的配置校验
+    from src.config.settings import Config
+    from src.utils.exceptions import ConfigurationError
+    try:
+        Config()
+    except ConfigurationError as e:
+        logger.error(f"配置校验失败: {e}")
+        OUTPUT_FILE.unlink()
+        sys.exit(1)
+    logger.info("配置校验通过")
+
+if __name__ == '__main__':
+    main()